@@ -0,0 +1,100 @@
+import concurrent.futures
+import multiprocessing
+import os
+import time
+from .portfolio import Member
+from .portfolio import _action_ids
+from .portfolio import _validate
+
+
+def solve_batch(problem, problems, planner='greedy_ff', workers=None,
+                window=None):
+    # type: (Domain, Iterable) -> Iterator
+    """Solve many `(problem_id, init, goal)` triples against one domain
+
+    `problem` is grounded and compiled once, before the worker processes
+    start, and the workers share it: where processes are forked they
+    inherit it copy-on-write, otherwise it is sent once to each worker.
+    `planner` is a name of `STRATEGIES` or a callable as accepted by
+    `Member`.  At most `window` problems, by default four per worker, are
+    queued at a time, so `problems` may be a lazy iterable.
+
+    `problem` must be grounded without `init`, as the static facts of an
+    init used for grounding are assumed by every ground action; ValueError
+    is raised otherwise.  Its typed facts are the only static facts assumed,
+    and each `init` is checked against them by the planner.
+
+    Yields `(problem_id, plan, stats)` in completion order.  `plan` is a
+    `Plan` replayed on the compiled task from `init` to `goal`, or None.
+    `stats` holds the solving `time` in seconds, the `pid` of the worker
+    and, if the planner raised, the `error`.
+
+    Example
+    --------
+
+        problems = ((i, init, goal) for i, (init, goal) in enumerate(pairs))
+        for i, plan, stats in solve_batch(problem, problems, workers=8):
+            print(i, plan, stats['time'])
+
+    """
+    if problem.grounding_init is not None:
+        raise ValueError("solve_batch needs a domain grounded without init")
+    planner = Member(planner).planner
+    task = problem.compile()
+    workers = workers or os.cpu_count() or 1
+    window = window or 4 * workers
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context(
+        'fork' if 'fork' in methods else None)
+
+    with concurrent.futures.ProcessPoolExecutor(
+            workers, mp_context=context, initializer=_init_worker,
+            initargs=(problem, planner)) as executor:
+        pending = {}
+        problems = iter(problems)
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < window:
+                try:
+                    problem_id, init, goal = next(problems)
+                except StopIteration:
+                    exhausted = True
+                    break
+                future = executor.submit(_solve, init, goal)
+                pending[future] = (problem_id, init, goal)
+            if not pending:
+                break
+            done, _ = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                problem_id, init, goal = pending.pop(future)
+                actions, stats = future.result()
+                init_set, rest = task.split(problem.prune_static(init))
+                goal_set, goal_rest = task.split(problem.prune_static(goal))
+                plan = None
+                if goal_rest.issubset(rest):
+                    plan = _validate(task, init_set, goal_set, rest, actions)
+                yield problem_id, plan, stats
+
+
+# State of a worker process, set by _init_worker
+_worker = {}
+
+
+def _init_worker(problem, planner):
+    _worker['problem'] = problem
+    _worker['planner'] = planner
+
+
+def _solve(init, goal):
+    """Solve one problem in a worker; returns the action ids and stats"""
+    problem = _worker['problem']
+    stats = {'pid': os.getpid()}
+    start = time.perf_counter()
+    try:
+        actions = _action_ids(problem, _worker['planner'](problem, init, goal))
+    except Exception as e:
+        actions = None
+        stats['error'] = repr(e)
+    stats['time'] = time.perf_counter() - start
+    return actions, stats
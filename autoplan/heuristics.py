@@ -0,0 +1,256 @@
+import heapq
+import math
+from collections import OrderedDict
+from .task import _ids
+
+
+class Heuristic:
+    """Base class of the heuristics evaluated on a compiled `Task`
+
+    A heuristic is bound to the task of one domain.  `evaluate` takes the
+    bitmasks of a state and of a goal; calling the heuristic with frozensets
+    of states, as `best_first_search` does for plain callables, encodes them
+    first.  Search functions call `evaluate` directly when the heuristic is
+    bound to the task they search.
+
+    """
+    def __init__(self, problem):
+        # type: (Domain) -> None
+        self.task = problem.compile()
+
+    def __call__(self, state, goal):
+        state_set, _ = self.task.split(state)
+        goal_set, goal_rest = self.task.split(goal)
+        if not goal_rest.issubset(state):
+            return math.inf
+        return self.evaluate(state_set, goal_set)
+
+    def evaluate(self, state, goal):
+        # type: (int, int) -> float
+        raise NotImplementedError
+
+
+class _RelaxedExploration(Heuristic):
+    """Cost propagation in the delete relaxation
+
+    Runs a Dijkstra-style fixpoint where an action becomes applicable once
+    its counter of unreached preconditions drops to zero.  The cost of an
+    action is its own cost plus the sum (`_additive`) or the maximum of the
+    costs of its preconditions.  All per-fact and per-action arrays are
+    allocated once and reset by slice assignment on each evaluation.
+
+    """
+    _additive = True
+
+    def __init__(self, problem):
+        # type: (Domain) -> None
+        super().__init__(problem)
+        task = self.task
+        nfacts = len(task.facts)
+        nactions = len(task.actions)
+        self._preconditions = [_ids(m) for m in task.preconditions]
+        self._add_effects = [_ids(m) for m in task.add_effects]
+        self._consumers = [[] for _ in range(nfacts)]
+        for a, pres in enumerate(self._preconditions):
+            for f in pres:
+                self._consumers[f].append(a)
+        self._counts = [len(pres) for pres in self._preconditions]
+        self._unconditional = [a for a in range(nactions) if not self._counts[a]]
+
+        self._inf_facts = [math.inf] * nfacts
+        self._none_facts = [None] * nfacts
+        self._zero_actions = [0] * nactions
+        self._fact_cost = list(self._inf_facts)
+        self._supporter = list(self._none_facts)
+        self._unsatisfied = list(self._counts)
+        self._action_cost = list(self._zero_actions)
+        self._goal_cache = (None, [])
+
+    def _goal_ids(self, goal):
+        if self._goal_cache[0] != goal:
+            self._goal_cache = (goal, _ids(goal))
+        return self._goal_cache[1]
+
+    def _explore(self, state, goal):
+        """Compute fact costs from `state` until every goal is settled
+
+        Returns the ids of the goal facts.
+
+        """
+        costs = self.task.costs
+        fact_cost = self._fact_cost
+        supporter = self._supporter
+        unsatisfied = self._unsatisfied
+        action_cost = self._action_cost
+        fact_cost[:] = self._inf_facts
+        supporter[:] = self._none_facts
+        unsatisfied[:] = self._counts
+        action_cost[:] = self._zero_actions
+        additive = self._additive
+
+        queue = []
+        for f in _ids(state):
+            fact_cost[f] = 0
+            queue.append((0, f))
+        for a in self._unconditional:
+            c = costs[a]
+            for e in self._add_effects[a]:
+                if c < fact_cost[e]:
+                    fact_cost[e] = c
+                    supporter[e] = a
+                    heapq.heappush(queue, (c, e))
+
+        goal_ids = self._goal_ids(goal)
+        remaining = len(goal_ids)
+        while queue and remaining:
+            c, f = heapq.heappop(queue)
+            if c > fact_cost[f]:
+                continue
+            if goal >> f & 1:
+                remaining -= 1
+            for a in self._consumers[f]:
+                if additive:
+                    action_cost[a] += c
+                elif c > action_cost[a]:
+                    action_cost[a] = c
+                unsatisfied[a] -= 1
+                if unsatisfied[a] == 0:
+                    ac = action_cost[a] + costs[a]
+                    for e in self._add_effects[a]:
+                        if ac < fact_cost[e]:
+                            fact_cost[e] = ac
+                            supporter[e] = a
+                            heapq.heappush(queue, (ac, e))
+        return goal_ids
+
+
+class MaxHeuristic(_RelaxedExploration):
+    """h_max: the most expensive goal in the delete relaxation (admissible)"""
+    _additive = False
+
+    def evaluate(self, state, goal):
+        # type: (int, int) -> float
+        goal_ids = self._explore(state, goal)
+        return max((self._fact_cost[g] for g in goal_ids), default=0)
+
+
+class AdditiveHeuristic(_RelaxedExploration):
+    """h_add: the sum of the goal costs in the delete relaxation"""
+
+    def evaluate(self, state, goal):
+        # type: (int, int) -> float
+        goal_ids = self._explore(state, goal)
+        return sum(self._fact_cost[g] for g in goal_ids)
+
+
+class FFHeuristic(_RelaxedExploration):
+    """h_FF: the cost of a relaxed plan extracted from h_add supporters
+
+    The action ids of the last relaxed plan are kept in `relaxed_plan`.
+    `helpful_facts` is the bitmask of the subgoals of that plan achieved by
+    an action applicable in the evaluated state; the applicable actions
+    adding one of them are FF's helpful actions.
+
+    """
+    def __init__(self, problem):
+        # type: (Domain) -> None
+        super().__init__(problem)
+        self.relaxed_plan = []
+        self.helpful_facts = 0
+
+    def evaluate(self, state, goal):
+        # type: (int, int) -> float
+        goal_ids = self._explore(state, goal)
+        fact_cost = self._fact_cost
+        supporter = self._supporter
+        preconditions = self.task.preconditions
+        plan = []
+        self.relaxed_plan = plan
+        self.helpful_facts = 0
+        if any(fact_cost[g] == math.inf for g in goal_ids):
+            return math.inf
+
+        marked = set()
+        helpful = 0
+        open_facts = list(goal_ids)
+        while open_facts:
+            f = open_facts.pop()
+            a = supporter[f]
+            if a is None:
+                continue
+            if preconditions[a] & state == preconditions[a]:
+                helpful |= 1 << f
+            if a in marked:
+                continue
+            marked.add(a)
+            plan.append(a)
+            open_facts.extend(self._preconditions[a])
+        plan.reverse()
+        self.helpful_facts = helpful
+        costs = self.task.costs
+        return sum(costs[a] for a in plan)
+
+
+class HeuristicCache:
+    """Size-bounded LRU cache of heuristic values
+
+    Searches given a cache look up `(goal, state)` before evaluating a state,
+    both keys being bitmasks of the compiled task, and store what they
+    compute.  The least recently used entry is evicted once `maxsize`
+    entries are stored.  A cache can be shared by several searches with the
+    same heuristic and domain, e.g. across restarts; it must not be shared
+    between different heuristics or domains.
+
+    Example
+    --------
+
+        cache = HeuristicCache(maxsize=100000)
+        plan = enforced_hill_climbing_search(problem, h, init, goal,
+                                             cache=cache)
+        cache.hits, cache.misses, cache.hit_rate
+
+    """
+    def __init__(self, maxsize=1000000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def get(self, key, valid=None):
+        """Return the entry stored for `key`, or None
+
+        With `valid`, an entry for which `valid(entry)` is false counts as
+        a miss and None is returned.
+
+        """
+        entry = self._entries.get(key)
+        if entry is None or (valid is not None and not valid(entry)):
+            entry = None
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return 'HeuristicCache(size={}, hits={}, misses={}, evictions={})'.format(
+            len(self), self.hits, self.misses, self.evictions)
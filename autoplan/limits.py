@@ -0,0 +1,49 @@
+import time
+
+
+class SearchLimits:
+    """Time and node budget of a search, with cooperative cancellation
+
+    Searches given limits call `expand` once per expanded node and give up,
+    returning None, as soon as it returns True: once `max_expansions` nodes
+    have been expanded, `time_limit` seconds have passed since the limits
+    were created, or `cancel`, any object with an `is_set()` method such as
+    `threading.Event`, is set.  One instance can be shared by successive
+    searches to give them a common budget.
+
+    Example
+    --------
+
+        limits = SearchLimits(time_limit=1.5, max_expansions=100000)
+        plan = astar_search(problem, h, init, goal, limits=limits)
+        if plan is None and limits.exceeded():
+            ...  # out of budget rather than unsolvable
+
+    """
+    def __init__(self, time_limit=None, max_expansions=None, cancel=None):
+        self.deadline = (None if time_limit is None
+                         else time.monotonic() + time_limit)
+        self.max_expansions = max_expansions
+        self.cancel = cancel
+        self.expansions = 0
+
+    def expand(self):
+        """Count one expansion and return True if the search must stop"""
+        self.expansions += 1
+        return self.exceeded()
+
+    def exceeded(self):
+        """Return True if the budget is spent or the search was cancelled"""
+        if (self.max_expansions is not None and
+                self.expansions > self.max_expansions):
+            return True
+        if self.cancel is not None and self.cancel.is_set():
+            return True
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    @property
+    def remaining(self):
+        """Seconds left before the deadline, or None"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
@@ -0,0 +1,57 @@
+import json
+import logging
+import sys
+
+
+TRACE = 5
+logging.addLevelName(TRACE, 'TRACE')
+
+logger = logging.getLogger('autoplan')
+logger.addHandler(logging.NullHandler())
+
+
+class TraceFormatter(logging.Formatter):
+    """Format log records as JSON lines
+
+    Each line holds the time, logger, level and message of the record, plus
+    the structured `fields` that planners pass with `extra`.
+
+    """
+    def format(self, record):
+        data = {
+            'time': record.created,
+            'logger': record.name,
+            'level': record.levelname,
+            'message': record.getMessage(),
+        }
+        data.update(getattr(record, 'fields', {}))
+        return json.dumps(data, default=repr)
+
+
+def enable_trace(stream=None, level=TRACE):
+    """Log the diagnostics of the planners to `stream` as JSON lines
+
+    `stream` defaults to stderr.  At the default `TRACE` level every
+    planner event is logged; at `logging.DEBUG` only the coarser ones.
+    Returns the handler, to be passed to `disable_trace`, which also
+    restores the level the 'autoplan' logger had before.
+
+    Example
+    --------
+
+        handler = enable_trace(open('trace.jsonl', 'w'))
+        plan = enforced_hill_climbing_search(problem, h, init, goal)
+        disable_trace(handler)
+
+    """
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(TraceFormatter())
+    handler.previous_level = logger.level
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    return handler
+
+
+def disable_trace(handler):
+    logger.removeHandler(handler)
+    logger.setLevel(handler.previous_level)
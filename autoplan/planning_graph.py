@@ -3,36 +3,81 @@ import sys
 import math
 from typing import List, Dict
 import itertools
+import heapq
 from pprint import pprint, pformat
 from collections import defaultdict
 import time
+import logging
+from .heuristics import HeuristicCache
+from .log import TRACE
+from .profiling import run_profiled
+from .task import _ids
+
+
+logger = logging.getLogger(__name__)
+
 
 class Level:
+    __slots__ = ('actions', 'precondition_edges', 'add_edges', 'del_edges',
+                 'achievers', 'states', 'mutex_state_table',
+                 'mutex_action_table', 'mutex_state_count',
+                 'mutex_action_count', '_index', '_mutex_states',
+                 '_mutex_actions')
+
     def __init__(self):
         self.actions= set()
         self.precondition_edges = set()
         self.add_edges = set()
         self.del_edges = set()
+        # Actions adding each state, for solution extraction
+        self.achievers = defaultdict(set)
         self.states = set()
-        self.mutex_states = set()
-        self.mutex_actions = set()
+        # Mutex relations as adjacency bitsets over the ids of a _GraphIndex
+        self.mutex_state_table = None
+        self.mutex_action_table = None
+        self.mutex_state_count = 0
+        self.mutex_action_count = 0
+        self._index = None
+        self._mutex_states = None
+        self._mutex_actions = None
 
-    def __eq__(self, other):
-        if self.states ^ other.states:
-            return False
-        if self.actions ^ other.actions:
-            return False
-        if self.precondition_edges ^ other.precondition_edges:
-            return False
-        if self.add_edges ^ other.add_edges:
-            return False
-        if self.del_edges ^ other.del_edges:
-            return False
-        if self.mutex_states ^ other.mutex_states:
+    @property
+    def mutex_states(self):
+        """Set of the pairs of mutex states, as frozensets"""
+        if self._mutex_states is None:
+            self._mutex_states = _mutex_pairs(self.mutex_state_table,
+                                              self._index and self._index.facts)
+        return self._mutex_states
+
+    @property
+    def mutex_actions(self):
+        """Set of the pairs of mutex actions, as frozensets"""
+        if self._mutex_actions is None:
+            self._mutex_actions = _mutex_pairs(self.mutex_action_table,
+                                               self._index and self._index.actions)
+        return self._mutex_actions
+
+    def add_precondition_edge(self, s, a):
+        self.precondition_edges.add((s, a))
+
+    def add_add_edge(self, a, s):
+        self.add_edges.add((a, s))
+        self.achievers[s].add(a)
+
+    def add_del_edge(self, a, s):
+        self.del_edges.add((a, s))
+
+    def is_mutex_states(self, s, t):
+        if self.mutex_state_table is None:
             return False
-        if self.mutex_actions ^ other.mutex_actions:
+        i = self._index.fact_id(s)
+        return bool(self.mutex_state_table.get(i, 0) >> self._index.fact_id(t) & 1)
+
+    def is_mutex_actions(self, a, b):
+        if self.mutex_action_table is None:
             return False
-        return True
+        i = self._index.action_id(a)
+        return bool(self.mutex_action_table.get(i, 0) >> self._index.action_id(b) & 1)
 
     def __repr__(self):
         buffer = []
@@ -48,11 +93,21 @@ class Level:
 
 
 class Noop:
+    """No-op action carrying `state` over to the next level
+
+    Graphs share one no-op per fact through a `_NoopTable`, so no-ops are
+    compact and hash once.
+
+    """
+    __slots__ = ('state', 'preconditions', 'add_effects', 'del_effects',
+                 '_hash')
+
     def __init__(self, state):
-        self.preconditions = frozenset([state])
-        self.add_effects = frozenset([state])
-        self.del_effects = frozenset([])
         self.state = state
+        self.preconditions = frozenset([state])
+        self.add_effects = self.preconditions
+        self.del_effects = frozenset()
+        self._hash = hash(self.safe_name)
 
     @property
     def name(self):
@@ -63,55 +118,212 @@ class Noop:
         return '__NOOP__{}'.format(self.state.safe_name)
 
     def __hash__(self):
-        return hash(self.safe_name)
+        return self._hash
 
     def __repr__(self):
         return ''
 
     def __eq__(self, other):
-        return hash(self) == hash(other)
+        return (self is other or
+                isinstance(other, Noop) and self.state == other.state)
+
+
+class _NoopTable(dict):
+    """The no-op of each fact, created on first lookup"""
+    def __missing__(self, state):
+        noop = self[state] = Noop(state)
+        return noop
+
+
+def _mutex_pairs(table, objects):
+    pairs = set()
+    for i, bits in (table or {}).items():
+        for j in _ids(bits >> (i + 1)):
+            pairs.add(frozenset([objects[i], objects[i + 1 + j]]))
+    return pairs
+
+
+class _GraphIndex:
+    """Integer ids of the facts and actions of a planning graph
+
+    Facts and ground actions take the ids of the compiled task of the
+    problem.  Facts unknown to the task and no-ops get fresh ids on demand.
+    For each action id, `preconditions`, `add_effects` and `del_effects`
+    hold fact bitmasks and the `*_ids` lists hold the same facts as ids.
+
+    """
+    def __init__(self, problem):
+        # type: (Domain) -> None
+        task = problem.compile()
+        self.facts = list(task.facts)
+        self.fact_ids = dict(task.fact_ids)
+        self.actions = list(task.actions)
+        self.action_ids = {a: i for i, a in enumerate(self.actions)}
+        self.preconditions = list(task.preconditions)
+        self.add_effects = list(task.add_effects)
+        self.del_effects = list(task.del_effects)
+        self.precondition_ids = [_ids(m) for m in self.preconditions]
+        self.add_ids = [_ids(m) for m in self.add_effects]
+        self.del_ids = [_ids(m) for m in self.del_effects]
+        self._noops = {}
+
+    def fact_id(self, s):
+        i = self.fact_ids.get(s)
+        if i is None:
+            i = self.fact_ids[s] = len(self.facts)
+            self.facts.append(s)
+        return i
+
+    def action_id(self, a):
+        if isinstance(a, Noop):
+            i = self._noops.get(a.state)
+            if i is None:
+                f = self.fact_id(a.state)
+                i = self._noops[a.state] = len(self.actions)
+                self.action_ids[a] = i
+                self.actions.append(a)
+                self.preconditions.append(1 << f)
+                self.add_effects.append(1 << f)
+                self.del_effects.append(0)
+                self.precondition_ids.append([f])
+                self.add_ids.append([f])
+                self.del_ids.append([])
+            return i
+        return self.action_ids[a]
 
 
 class PlanningGraph:
-    def __init__(self, problem, init=[], goal=[]):
+    """GraphPlan planning graph
+
+    Levels are expanded until the goals can be extracted.  States only grow
+    and mutexes only shrink from one level to the next, so the graph has
+    leveled off as soon as a new level has as many states and state mutexes
+    as the previous one; `leveled_off` is then the index of that level.
+    Unless `materialize` is set, later levels are not built again: the
+    leveled-off level is appended in their place.
+
+    """
+    def __init__(self, problem, init=[], goal=[], materialize=False):
         # type: (Domain) -> None
         self._problem = problem
+        self._materialize = materialize
+        self._index = _GraphIndex(problem)
+        self._noops = _NoopTable()
         self._levels = []
         level = Level()
-        level.states = frozenset(init)
-        self._goals = frozenset(goal)
+        level.states = problem.prune_static(init, init=True)
+        level._index = self._index
+        level.mutex_state_table = {}
+        self._goals = problem.prune_static(goal)
         self._levels.append(level)
+        # Goal sets known to fail at each level
+        self._nogoods = defaultdict(set)
+        self._leveled_off = None
+        self._nogood_count = None
+        self._limits = None
+        self._stats = None
+
+    @property
+    def leveled_off(self):
+        """Index of the level where the graph leveled off, or None"""
+        return self._leveled_off
+
+    def solve(self, limits=None, stats=None, profile=None):
+        """Expand the graph until a solution is extracted
+
+        Once the graph has leveled off at level n, the problem is unsolvable
+        if the goals are not reachable without mutex, or if an extraction
+        failure leaves the number of no-goods memoized at level n unchanged
+        since the previous failure.
+
+        With `limits`, a `SearchLimits`, every level expansion and every
+        goal assignment tried by the extraction counts as an expansion, and
+        None is returned once they are exceeded.  No-goods found so far are
+        kept, so solving again resumes the work.  `stats`, a
+        `SearchStatistics`, records the levels, their mutex counts and the
+        time spent in expansion and extraction.  `profile`, a `Profiler` or
+        a directory, profiles the call.
 
-    def solve(self):
+        """
+        if profile is not None:
+            return run_profiled(profile, 'graphplan', self.solve, limits,
+                                stats)
+        self._limits = limits
+        self._stats = stats
+        if stats is not None:
+            stats.timings['grounding'] = self._problem.grounding_time
+        solution = self._solve(limits, stats)
+        if solution is not None and stats is not None:
+            stats.emit('plan', solution)
+        return solution
+
+    def _solve(self, limits, stats):
         while True:
+            if limits is not None and limits.exceeded():
+                return None
             if self._possible_goal():
-                print("Trying to extract solution...")
-                solution = self._extract_solution()
-                if solution:
+                logger.debug("Trying to extract solution at level %d",
+                             len(self._levels) - 1)
+                if stats is None:
+                    solution = self._extract_solution()
+                else:
+                    with stats.phase('extraction'):
+                        solution = self._extract_solution()
+                if solution is not None:
                     return solution
-            if not self._expand_graph():
-                print("Failed to solve problem")
+                if limits is not None and limits.exceeded():
+                    return None
+                if self._leveled_off is not None:
+                    count = len(self._nogoods[self._leveled_off])
+                    if count == self._nogood_count:
+                        logger.info("Failed to solve problem")
+                        return None
+                    self._nogood_count = count
+            elif self._leveled_off is not None:
+                logger.info("Failed to solve problem")
                 return None
+            if limits is not None and limits.expand():
+                return None
+            if logger.isEnabledFor(TRACE):
+                level = self._levels[-1]
+                logger.log(TRACE, "Expanding level %d", len(self._levels) - 1,
+                           extra={'fields': {
+                               'event': 'level',
+                               'index': len(self._levels) - 1,
+                               'states': len(level.states),
+                               'mutex_states': level.mutex_state_count}})
+            if stats is None:
+                self._expand_graph()
+                continue
+            with stats.phase('expansion'):
+                self._expand_graph()
+            stats.levels += 1
+            stats.mutex_states.append(self._levels[-1].mutex_state_count)
+            stats.mutex_actions.append(self._levels[-2].mutex_action_count)
+            stats.emit('level', len(self._levels) - 1, self._levels[-1])
 
     def _possible_goal(self):
         goals = self._goals
         if not goals.issubset(self._levels[-1].states):
             return False
         for g, h in itertools.permutations(goals, 2):
-            if set([g, h]) in self._levels[-1].mutex_states:
-                print("WARN: {} and {} are mutex states".format(g, h))
+            if self._levels[-1].is_mutex_states(g, h):
+                logger.debug("%s and %s are mutex states", g, h)
                 return False
         return True
 
     def _expand_graph(self):
+        if self._leveled_off is not None and not self._materialize:
+            self._levels.append(self._levels[self._leveled_off])
+            return True
         now_level = self._levels[-1]
         new_level = Level()
 
         # Extend no opts
         for s in now_level.states:
-            noop = Noop(s)
-            now_level.precondition_edges.add((s, noop))
-            now_level.add_edges.add((noop, s))
+            noop = self._noops[s]
+            now_level.add_precondition_edge(s, noop)
+            now_level.add_add_edge(noop, s)
             now_level.actions.add(noop)
             new_level.states.add(s)
 
@@ -120,109 +332,191 @@ class PlanningGraph:
             if a.preconditions.issubset(now_level.states):
                 now_level.actions.add(a)
                 for s in a.preconditions:
-                    now_level.precondition_edges.add((s, a))
+                    now_level.add_precondition_edge(s, a)
                 for e in a.add_effects:
-                    now_level.add_edges.add((a, e))
+                    now_level.add_add_edge(a, e)
                     new_level.states.add(e)
                 for e in a.del_effects:
                     if e in new_level.states:
-                        now_level.del_edges.add((a, e))
+                        now_level.add_del_edge(a, e)
 
-        # If a new layer has the same stetes with previous layer, return False
-        if now_level == new_level:
-            return False
+        self._analyze_mutex(now_level, new_level)
 
-        # Analyze mutex relations
-        for a, b in itertools.permutations(now_level.actions, 2):
-            # Incositent effects
-            if a.del_effects.intersection(b.add_effects):
-                now_level.mutex_actions.add(frozenset([a, b]))
-            if b.del_effects.intersection(a.add_effects):
-                now_level.mutex_actions.add(frozenset([a, b]))
-
-            # Interference
-            if a.del_effects.intersection(b.preconditions):
-                now_level.mutex_actions.add(frozenset([a, b]))
-            if b.del_effects.intersection(a.preconditions):
-                now_level.mutex_actions.add(frozenset([a, b]))
-
-            # Competing needs
-            for s, t in itertools.product(a.preconditions, b.preconditions):
-                if frozenset([s, t]) in self._levels[-1].mutex_states:
-                    now_level.mutex_actions.add(frozenset([a, b]))
-
-        # Check inconsistent support
-        for s, t in itertools.permutations(new_level.states, 2):
-            actions_for_s = [e[0] for e in now_level.add_edges if s == e[1]]
-            actions_for_t = [e[0] for e in now_level.add_edges if t == e[1]]
-            for a, b in itertools.product(actions_for_s, actions_for_t):
-                if frozenset([a, b]) not in now_level.mutex_actions:
-                    break
-            else:
-                new_level.mutex_states.add(frozenset([s, t]))
+        # States only grow and mutexes only shrink from level to level, so
+        # equal counts mean the graph has leveled off
+        if (self._leveled_off is None and
+                len(new_level.states) == len(now_level.states) and
+                new_level.mutex_state_count == now_level.mutex_state_count):
+            self._leveled_off = len(self._levels) - 1
+            if not self._materialize:
+                # The new level is a copy of the leveled-off one
+                self._levels.append(now_level)
+                return True
 
         self._levels.append(new_level)
         return True
 
+    def _analyze_mutex(self, now_level, new_level):
+        """Compute the mutex tables of the actions of `now_level` and of the
+        states of `new_level`
+
+        Actions are mutex if one deletes a precondition or an add effect of
+        the other (inconsistent effects and interference), or if they have
+        mutex preconditions (competing needs).  States are mutex if every
+        pair of their achievers is mutex (inconsistent support).  Each
+        relation is an adjacency bitset per id, built from per-fact bitsets
+        of the actions needing, consuming, deleting and adding that fact.
+
+        """
+        index = self._index
+        pre_ids = index.precondition_ids
+        add_ids = index.add_ids
+        del_ids = index.del_ids
+        actions = [index.action_id(a) for a in now_level.actions]
+        for s in new_level.states:
+            index.fact_id(s)
+
+        needs = defaultdict(int)
+        consumers = defaultdict(int)
+        deleters = defaultdict(int)
+        achievers = defaultdict(int)
+        for i in actions:
+            bit = 1 << i
+            for f in pre_ids[i]:
+                needs[f] |= bit
+                consumers[f] |= bit
+            for f in add_ids[i]:
+                needs[f] |= bit
+                achievers[f] |= bit
+            for f in del_ids[i]:
+                deleters[f] |= bit
+
+        state_table = now_level.mutex_state_table
+        action_table = {}
+        for i in actions:
+            m = 0
+            # Inconsistent effects and interference
+            for f in del_ids[i]:
+                m |= needs.get(f, 0)
+            for f in itertools.chain(pre_ids[i], add_ids[i]):
+                m |= deleters.get(f, 0)
+            # Competing needs
+            mutex_pre = 0
+            for f in pre_ids[i]:
+                mutex_pre |= state_table.get(f, 0)
+            for f in _ids(mutex_pre):
+                m |= consumers.get(f, 0)
+            action_table[i] = m & ~(1 << i)
+        now_level.mutex_action_table = action_table
+        now_level.mutex_action_count = sum(bin(m).count('1')
+                                           for m in action_table.values()) // 2
+        now_level._index = index
+        now_level._mutex_actions = None
+
+        # Inconsistent support
+        state_table = {}
+        for s, support in achievers.items():
+            common = -1
+            for a in _ids(support):
+                common &= action_table[a]
+            candidates = 0
+            for b in _ids(common):
+                candidates |= index.add_effects[b]
+            m = 0
+            for t in _ids(candidates & ~(1 << s)):
+                if achievers[t] & ~common == 0:
+                    m |= 1 << t
+            state_table[s] = m
+        new_level.mutex_state_table = state_table
+        new_level.mutex_state_count = sum(bin(m).count('1')
+                                          for m in state_table.values()) // 2
+        new_level._index = index
+        new_level._mutex_states = None
+
     def _extract_solution(self):
         """Extract a solution from this planning graph
 
-        Perform backward depth-first search
+        Perform backward depth-first search, level by level, memoizing the
+        goal sets that fail at each level
 
         """
-        goal_set = self._goals
-        index = len(self._levels) - 1
+        return self._extract(self._goals, len(self._levels) - 1)
+
+    def _extract(self, goals, index):
         if index == 0:
             return []
-        search_stack = []
-        action_tree = {}
-        action_candidates = []
-        for g in goal_set:
-            actions = set([e[0] for e in self._levels[index - 1].add_edges
-                           if e[1] == g])
-            action_candidates.append(actions)
-        for action_tuple in itertools.product(*action_candidates):
-            for a, b in itertools.combinations(action_tuple, 2):
-                if set([a, b]) in self._levels[index - 1].mutex_actions:
+        if goals in self._nogoods[index]:
+            return None
+        limits = self._limits
+        for actions in self._assignments(goals, index):
+            if limits is not None and limits.expand():
+                # Unfinished, so not a no-good
+                return None
+            if self._stats is not None:
+                self._stats.expanded += 1
+            subgoals = frozenset(s for a in actions for s in a.preconditions)
+            solution = self._extract(subgoals, index - 1)
+            if solution is not None:
+                solution.append(frozenset(a for a in actions
+                                          if not isinstance(a, Noop)))
+                return solution
+        if limits is not None and limits.exceeded():
+            return None
+        self._nogoods[index].add(goals)
+        return None
+
+    def _assignments(self, goals, index):
+        """Yield the sets of non-mutex actions of level `index - 1` achieving
+        `goals`
+
+        Goals are assigned one at a time, the most constrained first, and a
+        goal already achieved by a chosen action gets no new one.  No-ops
+        are tried before the other achievers.
+
+        """
+        level = self._levels[index - 1]
+        table = level.mutex_action_table or {}
+        action_id = self._index.action_id
+        achievers = level.achievers
+        goals = sorted(goals,
+                       key=lambda g: (len(achievers.get(g, ())), g.name))
+        candidates = [sorted(achievers.get(g, ()),
+                             key=lambda a: (not isinstance(a, Noop), a.name))
+                      for g in goals]
+        if not goals:
+            yield frozenset()
+            return
+
+        def next_candidates(k):
+            if any(a is not None and goals[k] in a.add_effects
+                   for a in chosen):
+                return iter([None])
+            return iter(candidates[k])
+
+        chosen = []
+        masks = [0]
+        stack = [next_candidates(0)]
+        while stack:
+            for a in stack[-1]:
+                if a is None or not masks[-1] >> action_id(a) & 1:
                     break
             else:
-                key = (index - 1, action_tuple)
-                action_tree[key] = None
-                search_stack.append(key)
-        while True:
-            if len(search_stack) == 0:
-                # No solution
-                return None
-            parent_key = search_stack.pop()
-            index, parent_actions = parent_key
-            goal_set = set()
-            for a in parent_actions:
-                goal_set.update(a.preconditions)
-            action_candidates = []
-            for g in goal_set:
-                actions = set([e[0] for e in self._levels[index - 1].add_edges
-                               if e[1] == g])
-                action_candidates.append(actions)
-            for action_tuple in itertools.product(*action_candidates):
-                for a, b in itertools.combinations(action_tuple, 2):
-                    if set([a, b]) in self._levels[index - 1].mutex_actions:
-                        break
-                else:
-                    if (index - 1) == 0:
-                        # Solution found
-                        solution = [frozenset([a for a in action_tuple
-                                               if not isinstance(a, Noop)])]
-                        a = (index, parent_actions)
-                        while a is not None:
-                            action = frozenset([a for a in a[1]
-                                                if not isinstance(a, Noop)])
-                            solution.append(action)
-                            a = action_tree[a]
-                        return solution
-                    else:
-                        key = (index - 1, tuple(action_tuple))
-                        action_tree[key] = (index, parent_actions)
-                        search_stack.append(key)
+                stack.pop()
+                if chosen:
+                    chosen.pop()
+                    masks.pop()
+                continue
+            chosen.append(a)
+            if a is None:
+                masks.append(masks[-1])
+            else:
+                masks.append(masks[-1] | table.get(action_id(a), 0))
+            if len(chosen) == len(goals):
+                yield frozenset(a for a in chosen if a is not None)
+                chosen.pop()
+                masks.pop()
+            else:
+                stack.append(next_candidates(len(chosen)))
 
     def visualize(self):
         """Visualize planning graph with Graphviz"""
@@ -265,45 +559,216 @@ class PlanningGraph:
 
 
 class RelaxedPlanningGraph:
-    def __init__(self, problem, init=[], goal=[]):
+    """Planning graph of the delete relaxation
+
+    With `incremental`, layers are not materialised as `Level` objects.
+    Instead the fixpoint of fact and action layers computed for one state is
+    updated to the next state from the facts added and deleted in between
+    (see `update`), so that only the layers depending on those facts are
+    recomputed.  Sibling states visited by a search differ in a few facts,
+    which makes evaluating them much cheaper than a rebuild.  With `cache`,
+    True or a `HeuristicCache`, heuristic values obtained by calling the
+    graph are memoized per goal and state in that size-bounded cache.  Its
+    keys are frozensets of facts, so it must not be shared with searches.
+
+    """
+    def __init__(self, problem, init=[], goal=[], incremental=False,
+                 cache=None):
         # type: (Domain) -> None
         self._problem = problem
         self._reverse_precondition_map = {}
         for s in self._problem.ground_states:
             self._reverse_precondition_map[s] = set()
-            for a in self._problem.ground_actions:
-                if s in a.preconditions:
-                    self._reverse_precondition_map[s].add(a)
+        self._achievers = defaultdict(list)
+        for a in self._problem.ground_actions:
+            for s in a.preconditions:
+                self._reverse_precondition_map.setdefault(s, set()).add(a)
+            for s in a.add_effects:
+                self._achievers[s].append(a)
+        # Actions left without preconditions by static pruning
+        self._unconditional_actions = [a for a in self._problem.ground_actions
+                                       if not a.preconditions]
+
+        self._noops = _NoopTable()
+        self._incremental = incremental
+        self._state = frozenset()
+        self._layers = {}
+        if cache is True:
+            cache = HeuristicCache()
+        elif cache is False:
+            cache = None
+        self._cache = cache
+        self.reset(init, goal)
 
+    def __call__(self, init, goal):
+        """Return the length of the relaxed plan from `init`, or `math.inf`
+
+        This lets a relaxed planning graph be used as a search heuristic.
+
+        """
+        if self._cache is not None:
+            key = (self._problem.prune_static(goal),
+                   self._problem.prune_static(init))
+            entry = self._cache.get(key)
+            if entry is not None:
+                h, self.helpful_actions = entry
+                return h
         self.reset(init, goal)
+        solution = self.solve()
+        h = math.inf if solution is None else len(solution)
+        if self._cache is not None:
+            self._cache.put(key, (h, self.helpful_actions))
+        return h
+
+    def solve(self, stats=None, profile=None):
+        """Return a relaxed plan from the state given to `reset`, or None
 
-    def solve(self):
+        `stats`, a `SearchStatistics`, records the number of levels and the
+        time spent in expansion and extraction.  `profile`, a `Profiler` or
+        a directory, profiles the call.
+
+        """
+        if profile is not None:
+            return run_profiled(profile, 'relaxed_planning_graph', self.solve,
+                                stats)
+        if stats is None:
+            return self._solve()
+        stats.timings['grounding'] = self._problem.grounding_time
+        solution = self._solve(stats)
+        if solution is not None:
+            stats.emit('plan', solution)
+        return solution
+
+    def _solve(self, stats=None):
+        if self._incremental:
+            if not all(g in self._layers for g in self._goals):
+                return None
+            if stats is None:
+                return self._extract_solution_incremental()
+            with stats.phase('extraction'):
+                return self._extract_solution_incremental()
         while True:
             if self._possible_goal():
-                solution = self._extract_solution_relaxed()
+                if stats is None:
+                    solution = self._extract_solution_relaxed()
+                else:
+                    with stats.phase('extraction'):
+                        solution = self._extract_solution_relaxed()
                 #solution = self._extract_solution()
                 if solution is not None:
                     return solution
-            if not self._expand_graph():
+            if stats is None:
+                if not self._expand_graph():
+                    return None
+                continue
+            with stats.phase('expansion'):
+                expanded = self._expand_graph()
+            if not expanded:
                 return None
+            stats.levels += 1
+            stats.emit('level', len(self._levels) - 1, self._levels[-1])
 
     def reset(self, init=[], goal=[]):
         self._levels = []
         level = Level()
-        level.states = frozenset(init)
-        self._goals = frozenset(goal)
+        level.states = self._problem.prune_static(init)
+        self._goals = self._problem.prune_static(goal)
         self._levels.append(level)
+        if self._incremental:
+            self.helpful_actions = frozenset()
+            self.update(level.states - self._state, self._state - level.states)
+            return
         self._layer_membership = defaultdict(lambda: -1)
         self._action_counters = defaultdict(lambda: 0)
-        self._ready_actions = []
+        self._ready_actions = list(self._unconditional_actions)
+        self.helpful_actions = frozenset()
 
-        for s in init:
+        for s in level.states:
             self._layer_membership[s] = 0
-            for a in self._reverse_precondition_map[s]:
+            for a in self._reverse_precondition_map.get(s, ()):
                 self._action_counters[a] += 1
                 if self._action_counters[a] == len(a.preconditions):
                     self._ready_actions.append(a)
 
+    def update(self, added=(), deleted=()):
+        """Update the incremental fixpoint after `added` and `deleted` facts
+
+        The layer of a fact is 0 if it holds and otherwise one more than the
+        lowest layer of its achievers; the layer of an action is the highest
+        layer of its preconditions.  Deleting facts can only raise layers:
+        the facts and actions whose every best support depends on a deleted
+        fact are invalidated, then rebuilt from their surviving neighbours.
+        Adding facts can only lower layers, which is propagated forward in
+        increasing layer order.
+
+        """
+        layers = self._layers
+        consumers = self._reverse_precondition_map
+        achievers = self._achievers
+        state = (self._state - frozenset(deleted)) | frozenset(added)
+        self._state = state
+
+        # Invalidate facts and actions whose layer may rise
+        invalid = []
+        stack = [f for f in deleted if f not in state]
+        while stack:
+            f = stack.pop()
+            if f not in layers:
+                continue
+            del layers[f]
+            invalid.append(f)
+            for a in consumers.get(f, ()):
+                la = layers.pop(a, None)
+                if la is None:
+                    continue
+                for e in a.add_effects:
+                    if (layers.get(e) == la + 1 and e not in state and
+                            not any(layers.get(b, -2) == la
+                                    for b in achievers[e])):
+                        stack.append(e)
+
+        # Seed the queue with the facts whose layer may fall
+        queue = []
+        counter = itertools.count()
+        for f in added:
+            if layers.get(f, math.inf) > 0:
+                layers[f] = 0
+                queue.append((0, next(counter), f))
+        for f in invalid:
+            best = min((layers[b] + 1 for b in achievers[f] if b in layers),
+                       default=None)
+            if best is not None:
+                layers[f] = best
+                queue.append((best, next(counter), f))
+        for a in self._unconditional_actions:
+            if a not in layers:
+                layers[a] = 0
+                for e in a.add_effects:
+                    if layers.get(e, math.inf) > 1:
+                        layers[e] = 1
+                        queue.append((1, next(counter), e))
+        heapq.heapify(queue)
+
+        while queue:
+            c, _, f = heapq.heappop(queue)
+            if layers.get(f) != c:
+                continue
+            for a in consumers.get(f, ()):
+                la = 0
+                for p in a.preconditions:
+                    lp = layers.get(p)
+                    if lp is None:
+                        break
+                    if lp > la:
+                        la = lp
+                else:
+                    if la < layers.get(a, math.inf):
+                        layers[a] = la
+                        for e in a.add_effects:
+                            if la + 1 < layers.get(e, math.inf):
+                                layers[e] = la + 1
+                                heapq.heappush(queue, (la + 1, next(counter), e))
+
     def _possible_goal(self):
         return all(self._layer_membership[x] >= 0 for x in self._goals)
 
@@ -314,10 +779,10 @@ class RelaxedPlanningGraph:
 
         # Extend no opts
         for s in now_level.states:
-            noop = Noop(s)
+            noop = self._noops[s]
             now_level.actions.add(noop)
-            now_level.precondition_edges.add((s, noop))
-            now_level.add_edges.add((noop, s))
+            now_level.add_precondition_edge(s, noop)
+            now_level.add_add_edge(noop, s)
             new_level.states.add(s)
 
         # Extend actions
@@ -327,20 +792,20 @@ class RelaxedPlanningGraph:
             if self._layer_membership[a] < 0:
                 self._layer_membership[a] = index
             for s in a.preconditions:
-                now_level.precondition_edges.add((s, a))
+                now_level.add_precondition_edge(s, a)
             for e in a.add_effects:
-                now_level.add_edges.add((a, e))
+                now_level.add_add_edge(a, e)
                 new_level.states.add(e)
                 if self._layer_membership[e] < 0:
                     self._layer_membership[e] = index + 1
-                    for a in self._reverse_precondition_map[e]:
-                        self._action_counters[a] += 1
-                        if self._action_counters[a] == len(a.preconditions):
-                            new_ready_actions.append(a)
+                    for b in self._reverse_precondition_map.get(e, ()):
+                        self._action_counters[b] += 1
+                        if self._action_counters[b] == len(b.preconditions):
+                            new_ready_actions.append(b)
         self._ready_actions.extend(new_ready_actions)
 
-        # If a new layer has the same stetes with previous layer, return False
-        if now_level == new_level:
+        # The relaxed graph has leveled off once a layer adds no new state
+        if len(new_level.states) == len(now_level.states):
             return False
 
         self._levels.append(new_level)
@@ -354,10 +819,10 @@ class RelaxedPlanningGraph:
 
         # Extend no opts
         for s in now_level.states:
-            noop = Noop(s)
+            noop = self._noops[s]
             now_level.actions.add(noop)
-            now_level.precondition_edges.add((s, noop))
-            now_level.add_edges.add((noop, s))
+            now_level.add_precondition_edge(s, noop)
+            now_level.add_add_edge(noop, s)
             new_level.states.add(s)
 
         # Extend actions
@@ -368,23 +833,29 @@ class RelaxedPlanningGraph:
             if self._layer_membership[a] < 0:
                 self._layer_membership[a] = index
             for s in a.preconditions:
-                now_level.precondition_edges.add((s, a))
+                now_level.add_precondition_edge(s, a)
             for e in a.add_effects:
-                now_level.add_edges.add((a, e))
+                now_level.add_add_edge(a, e)
                 new_level.states.add(e)
                 if self._layer_membership[e] < 0:
                     self._layer_membership[e] = index + 1
-                    for a in self._reverse_precondition_map[e]:
-                        self._action_counters[a] += 1
+                    for b in self._reverse_precondition_map.get(e, ()):
+                        self._action_counters[b] += 1
 
-        # If a new layer has the same stetes with previous layer, return False
-        if now_level == new_level:
+        # The relaxed graph has leveled off once a layer adds no new state
+        if len(new_level.states) == len(now_level.states):
             return False
 
         self._levels.append(new_level)
         return True
 
     def _extract_solution_relaxed(self):
+        """Extract a relaxed plan
+
+        Also sets `helpful_actions`, the actions of the first layer that
+        achieve a subgoal of the first layer (FF's helpful actions).
+
+        """
         solution = []
         goals = self._goals
         m = len(self._levels)
@@ -395,8 +866,8 @@ class RelaxedPlanningGraph:
         for i in range(m, 0, -1):
             for g in [x for x in G[i] if not mark_table[(i, x)]]:
                 os = []
-                for o in self._levels[i - 1].actions:
-                    if g in o.add_effects and self._layer_membership[o] == (i - 1):
+                for o in self._levels[i - 1].achievers.get(g, ()):
+                    if self._layer_membership[o] == (i - 1):
                         difficulty = sum(self._layer_membership[p] for p in o.preconditions)
                         os.append((o, difficulty))
                 o, _ = min(os, key=lambda x: x[1])
@@ -407,9 +878,43 @@ class RelaxedPlanningGraph:
                 for f in o.add_effects:
                     mark_table[(i, f)] = True
                     mark_table[(i - 1, f)] = True
+        self.helpful_actions = frozenset(
+            o for g in G[1] for o in self._levels[0].achievers.get(g, ())
+            if not isinstance(o, Noop))
         return list(reversed(solution))
 
 
+    def _extract_solution_incremental(self):
+        """Extract a relaxed plan from the incremental fixpoint
+
+        Same procedure as `_extract_solution_relaxed`, with achievers looked
+        up by layer instead of through `Level` objects.
+
+        """
+        layers = self._layers
+        achievers = self._achievers
+        solution = []
+        m = max((layers[g] for g in self._goals), default=0)
+        G = [set() for _ in range(m + 1)]
+        for g in self._goals:
+            G[layers[g]].add(g)
+        marked = set()
+        for i in range(m, 0, -1):
+            for g in [x for x in G[i] if (i, x) not in marked]:
+                o = min((o for o in achievers[g] if layers.get(o) == i - 1),
+                        key=lambda o: sum(layers[p] for p in o.preconditions))
+                solution.append(o)
+                for f in o.preconditions:
+                    if layers[f] != 0 and (i - 1, f) not in marked:
+                        G[layers[f]].add(f)
+                for f in o.add_effects:
+                    marked.add((i, f))
+                    marked.add((i - 1, f))
+        if m >= 1:
+            self.helpful_actions = frozenset(
+                o for g in G[1] for o in achievers[g] if layers.get(o) == 0)
+        return list(reversed(solution))
+
     def _extract_solution(self):
         """Extract a solution from this planning graph
 
@@ -424,12 +929,11 @@ class RelaxedPlanningGraph:
         action_tree = {}
         action_candidates = []
         for g in goal_set:
-            actions = set([e[0] for e in self._levels[index - 1].add_edges
-                           if e[1] == g])
+            actions = set(self._levels[index - 1].achievers.get(g, ()))
             action_candidates.append(actions)
         for action_tuple in itertools.product(*action_candidates):
             for a, b in itertools.combinations(action_tuple, 2):
-                if set([a, b]) in self._levels[index - 1].mutex_actions:
+                if self._levels[index - 1].is_mutex_actions(a, b):
                     break
             else:
                 key = (index - 1, action_tuple)
@@ -446,12 +950,11 @@ class RelaxedPlanningGraph:
                 goal_set.update(a.preconditions)
             action_candidates = []
             for g in goal_set:
-                actions = set([e[0] for e in self._levels[index - 1].add_edges
-                               if e[1] == g])
+                actions = set(self._levels[index - 1].achievers.get(g, ()))
                 action_candidates.append(actions)
             for action_tuple in itertools.product(*action_candidates):
                 for a, b in itertools.combinations(action_tuple, 2):
-                    if set([a, b]) in self._levels[index - 1].mutex_actions:
+                    if self._levels[index - 1].is_mutex_actions(a, b):
                         break
                 else:
                     if (index - 1) == 0:
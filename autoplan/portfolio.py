@@ -0,0 +1,233 @@
+import math
+import multiprocessing
+import time
+import weakref
+from multiprocessing.connection import wait
+from .heuristics import FFHeuristic
+from .heuristics import MaxHeuristic
+from .planning_graph import PlanningGraph
+from .planning_graph import RelaxedPlanningGraph
+from .search import Plan
+from .search import astar_search
+from .search import greedy_best_first_search
+from .strips import breadth_first_search
+from .strips import depth_first_search
+from .strips import enforced_hill_climbing_search
+
+
+def _enforced_hill_climbing(problem, init, goal, **kwargs):
+    return enforced_hill_climbing_search(problem, FFHeuristic(problem), init,
+                                         goal, helpful_actions=True, **kwargs)
+
+
+def _greedy_ff(problem, init, goal, **kwargs):
+    return greedy_best_first_search(problem, FFHeuristic(problem), init, goal,
+                                    preferred=True, **kwargs)
+
+
+def _astar_max(problem, init, goal, **kwargs):
+    return astar_search(problem, MaxHeuristic(problem), init, goal, **kwargs)
+
+
+def _graphplan(problem, init, goal, **kwargs):
+    return PlanningGraph(problem, init, goal).solve(**kwargs)
+
+
+def _relaxed_plan(problem, init, goal, limits=None, **kwargs):
+    # A relaxed plan takes polynomial time, so limits are not checked
+    return RelaxedPlanningGraph(problem, init, goal).solve(**kwargs)
+
+
+# Planners by name, called as `planner(problem, init, goal)`; keyword
+# arguments such as `limits` and `stats` are passed on to the search
+STRATEGIES = {
+    'breadth_first': breadth_first_search,
+    'depth_first': depth_first_search,
+    'enforced_hill_climbing': _enforced_hill_climbing,
+    'greedy_ff': _greedy_ff,
+    'astar_max': _astar_max,
+    'graphplan': _graphplan,
+    'relaxed_plan': _relaxed_plan,
+}
+
+
+class Member:
+    """A planner of a portfolio with its own limits
+
+    `planner` is a name of `STRATEGIES` or a callable
+    `planner(problem, init, goal)` returning a `Plan`, a sequence of actions
+    or a sequence of sets of actions run in parallel, as
+    `PlanningGraph.solve` does, or None.  `time_limit` is in seconds and
+    `memory_limit` bounds the address space of the worker process in bytes.
+
+    """
+    def __init__(self, planner, time_limit=None, memory_limit=None, name=None):
+        if isinstance(planner, str):
+            if planner not in STRATEGIES:
+                raise ValueError("Unknown strategy: {}".format(planner))
+            name = name or planner
+            planner = STRATEGIES[planner]
+        self.planner = planner
+        self.time_limit = time_limit
+        self.memory_limit = memory_limit
+        self.name = name or getattr(planner, '__name__', repr(planner))
+
+    def __repr__(self):
+        return 'Member({})'.format(self.name)
+
+
+DEFAULT_MEMBERS = ['greedy_ff', 'enforced_hill_climbing', 'breadth_first',
+                   'graphplan']
+
+
+def portfolio_search(problem, init=[], goal=[], members=DEFAULT_MEMBERS,
+                     time_limit=None, memory_limit=None, deadline=None,
+                     best=False):
+    # type: (Domain) -> Plan
+    """Race several planners on `problem` in worker processes
+
+    Each of `members`, a `Member` or a name of `STRATEGIES`, runs in its
+    own process.  `time_limit` and `memory_limit` apply to the members that
+    set no limit of their own.  Every plan returned by a member is checked
+    against `init` and `goal`, and invalid plans are ignored.
+
+    By default the first valid plan is returned and the other members are
+    terminated.  With `best`, members run until they finish, reach their
+    limits or `deadline` seconds have passed, and the valid plan of lowest
+    cost is returned.  Returns None if no member found a valid plan.
+
+    Example
+    --------
+
+        plan = portfolio_search(problem, init, goal,
+                                members=['greedy_ff', Member('graphplan', 10)],
+                                memory_limit=2 ** 30, deadline=30, best=True)
+
+    """
+    task = problem.compile()
+    init_set, rest = task.split(problem.prune_static(init, init=True))
+    goal_set, goal_rest = task.split(problem.prune_static(goal))
+    if not goal_rest.issubset(rest):
+        return None
+    members = [m if isinstance(m, Member) else Member(m) for m in members]
+
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context(
+        'fork' if 'fork' in methods else None)
+    start = time.monotonic()
+    running = {}
+    for m in members:
+        receiver, sender = context.Pipe(duplex=False)
+        limit = m.memory_limit if m.memory_limit is not None else memory_limit
+        process = context.Process(
+            target=_run_member,
+            args=(sender, m.planner, problem, init, goal, limit), daemon=True)
+        process.start()
+        sender.close()
+        seconds = m.time_limit if m.time_limit is not None else time_limit
+        expiry = math.inf if seconds is None else start + seconds
+        running[receiver] = (m, process, expiry)
+
+    stop = math.inf if deadline is None else start + deadline
+    result = None
+    try:
+        while running:
+            now = time.monotonic()
+            expiry = min([stop] + [e for _, _, e in running.values()])
+            timeout = None if expiry == math.inf else max(0, expiry - now)
+            ready = wait(list(running) + [p.sentinel for _, p, _ in
+                                          running.values()], timeout)
+            for receiver in list(running):
+                m, process, expiry = running[receiver]
+                if receiver.poll():
+                    try:
+                        actions = receiver.recv()
+                    except EOFError:
+                        actions = None
+                elif process.sentinel in ready:
+                    actions = None
+                elif time.monotonic() >= expiry:
+                    process.terminate()
+                    actions = None
+                else:
+                    continue
+                del running[receiver]
+                receiver.close()
+                plan = _validate(task, init_set, goal_set, rest, actions)
+                if plan is not None and (result is None or
+                                         plan.cost < result.cost):
+                    result = plan
+            if result is not None and not best:
+                break
+            if time.monotonic() >= stop:
+                break
+    finally:
+        for receiver, (_, process, _) in running.items():
+            process.terminate()
+            receiver.close()
+        for _, process, _ in running.values():
+            process.join()
+    return result
+
+
+def _run_member(sender, planner, problem, init, goal, memory_limit):
+    """Run `planner` and send the ids of the actions of its plan, or None"""
+    actions = None
+    try:
+        if memory_limit is not None:
+            import resource
+            resource.setrlimit(resource.RLIMIT_AS,
+                               (memory_limit, memory_limit))
+        actions = _action_ids(problem, planner(problem, init, goal))
+    except Exception:
+        actions = None
+    finally:
+        sender.send(actions)
+        sender.close()
+
+
+def _action_ids(problem, solution):
+    """Return the ids in the task of `problem` of the actions of `solution`
+
+    `solution` is anything a `Member` planner returns; the actions of a
+    parallel step are ordered by name.
+
+    """
+    if solution is None:
+        return None
+    if isinstance(solution, Plan):
+        steps = solution.actions
+    else:
+        steps = []
+        for step in solution:
+            if isinstance(step, (set, frozenset)):
+                steps.extend(sorted(step, key=lambda a: a.name))
+            else:
+                steps.append(step)
+    task = problem.compile()
+    ids = _task_action_ids.get(task)
+    if ids is None:
+        ids = _task_action_ids[task] = {a: i for i, a in
+                                        enumerate(task.actions)}
+    return [ids[a] for a in steps]
+
+
+# Action ids of the tasks seen by this process
+_task_action_ids = weakref.WeakKeyDictionary()
+
+
+def _validate(task, init, goal, rest, actions):
+    """Return the `Plan` of the action ids `actions`, or None if they do not
+    reach `goal` from `init`"""
+    if actions is None:
+        return None
+    state = init
+    steps = []
+    for a in actions:
+        if task.preconditions[a] & state != task.preconditions[a]:
+            return None
+        state = task.successor(state, a)
+        steps.append((task.actions[a], task.decode(state) | rest))
+    if goal & state != goal:
+        return None
+    return Plan(steps)
@@ -0,0 +1,230 @@
+import bisect
+import cProfile
+import importlib
+import io
+import itertools
+import os
+import pstats
+import time
+import tracemalloc
+from collections import defaultdict
+
+
+# Entry points of each phase, as 'module:qualified name' in this package.
+# The time of a phase is the cumulative time spent under its entry points.
+PHASES = [
+    ('grounding', ['strips:Domain._ground', 'strips:Domain.compile']),
+    ('successor generation', ['task:Task.applicable', 'task:Task.successor']),
+    ('heuristic evaluation', ['heuristics:Heuristic.__call__',
+                              'heuristics:MaxHeuristic.evaluate',
+                              'heuristics:AdditiveHeuristic.evaluate',
+                              'heuristics:FFHeuristic.evaluate',
+                              'planning_graph:RelaxedPlanningGraph.__call__']),
+    ('mutex analysis', ['planning_graph:PlanningGraph._analyze_mutex']),
+]
+
+# Numbers the captures of this process, so that their files never collide
+_sequence = itertools.count()
+
+
+def _entry_points():
+    """Yield each phase of `PHASES` with the profiler keys of its entry
+    points"""
+    for phase, names in PHASES:
+        keys = set()
+        for name in names:
+            module, qualname = name.split(':')
+            obj = importlib.import_module('.' + module, __package__)
+            for attr in qualname.split('.'):
+                obj = getattr(obj, attr)
+            code = obj.__code__
+            keys.add((code.co_filename, code.co_firstlineno, code.co_name))
+        yield phase, keys
+
+
+class Profiler:
+    """cProfile and tracemalloc capture of planner calls
+
+    Used as a context manager, or through the `profile` argument of the
+    planner entry points, which takes a `Profiler` or a directory.  On exit
+    three files named after `name`, the time, the process id and a
+    sequence number are written to `directory`: the cProfile statistics
+    (`.prof`, readable by `pstats` and snakeviz), the tracemalloc snapshot
+    (`.snapshot`, readable by `tracemalloc.Snapshot.load`) and a text
+    summary (`.txt`).  The summary gives the time and memory per phase,
+    grounding, successor generation, heuristic evaluation and mutex
+    analysis, and the `top` functions and allocation sites of each phase
+    and overall.  The time of a phase is the cumulative time under its
+    entry points (see `PHASES`); its memory and functions are those of the
+    functions only called under them, so helpers shared with other code are
+    left to the overall lists.
+
+    Example
+    --------
+
+        plan = breadth_first_search(problem, init, goal, profile='/tmp/prof')
+
+        with Profiler('/tmp/prof', 'solve') as profiler:
+            plan = PlanningGraph(problem, init, goal).solve()
+        print(profiler.summary)
+
+    """
+    def __init__(self, directory='.', name='autoplan', top=10, memory=True,
+                 frames=1):
+        self.directory = os.path.expanduser(directory)
+        self.name = name
+        self.top = top
+        self.memory = memory
+        self.frames = frames
+        self.summary = None
+        self.paths = {}
+
+    def __enter__(self):
+        self._tracing = False
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._tracing = True
+        self._profile = cProfile.Profile()
+        self._start = time.perf_counter()
+        self._profile.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self._profile.disable()
+        elapsed = time.perf_counter() - self._start
+        snapshot = None
+        if self.memory:
+            snapshot = tracemalloc.take_snapshot()
+            if self._tracing:
+                tracemalloc.stop()
+        self._write(elapsed, snapshot)
+        return False
+
+    def _write(self, elapsed, snapshot):
+        os.makedirs(self.directory, exist_ok=True)
+        prefix = os.path.join(self.directory, '{}-{}-{}-{}'.format(
+            self.name, time.strftime('%Y%m%d-%H%M%S'), os.getpid(),
+            next(_sequence)))
+        self.paths['profile'] = prefix + '.prof'
+        self._profile.dump_stats(self.paths['profile'])
+        if snapshot is not None:
+            self.paths['snapshot'] = prefix + '.snapshot'
+            snapshot.dump(self.paths['snapshot'])
+        self.summary = self._summarize(elapsed, snapshot)
+        self.paths['summary'] = prefix + '.txt'
+        with open(self.paths['summary'], 'w') as f:
+            f.write(self.summary)
+
+    def _summarize(self, elapsed, snapshot):
+        stats = pstats.Stats(self._profile)
+        lines = ['{}: {:.3f}s'.format(self.name, elapsed), '']
+
+        callees = defaultdict(set)
+        starts = defaultdict(list)
+        for key, row in stats.stats.items():
+            starts[key[0]].append((key[1], key))
+            for caller in row[4]:
+                callees[caller].add(key)
+        for filename in starts:
+            starts[filename].sort()
+
+        # Cumulative time under the entry points of each phase, less the
+        # calls between entry points of the same phase, and the functions
+        # only called from them
+        phases = []
+        times = {}
+        members = {}
+        for phase, entries in _entry_points():
+            entries = entries.intersection(stats.stats)
+            phases.append(phase)
+            times[phase] = sum(
+                stats.stats[key][3] -
+                sum(row[3] for caller, row in stats.stats[key][4].items()
+                    if caller in entries)
+                for key in entries)
+            members[phase] = _owned(stats.stats, callees, entries)
+
+        sizes = defaultdict(int)
+        sites = defaultdict(list)
+        if snapshot is not None:
+            for stat in snapshot.statistics('lineno'):
+                frame = stat.traceback[0]
+                key = _function_at(starts, frame.filename, frame.lineno)
+                for phase in phases:
+                    if key in members[phase]:
+                        sizes[phase] += stat.size
+                        sites[phase].append(stat)
+
+        lines.append('{:<24}{:>10}{:>14}'.format('phase', 'time', 'memory'))
+        for phase in phases:
+            lines.append('{:<24}{:>9.3f}s{:>14}'.format(
+                phase, times[phase],
+                _size(sizes[phase]) if snapshot is not None else '-'))
+        for phase in phases:
+            if not members[phase]:
+                continue
+            lines += ['', '== {} =='.format(phase)]
+            functions = sorted(members[phase],
+                               key=lambda key: stats.stats[key][2],
+                               reverse=True)
+            for key in functions[:self.top]:
+                filename, lineno, function = key
+                lines.append('  {:8.3f}s self {:8.3f}s cum  {}:{}({})'.format(
+                    stats.stats[key][2], stats.stats[key][3],
+                    os.path.basename(filename), lineno, function))
+            for stat in sites[phase][:self.top]:
+                frame = stat.traceback[0]
+                lines.append('  {:>10} in {:>7} blocks  {}:{}'.format(
+                    _size(stat.size), stat.count,
+                    os.path.basename(frame.filename), frame.lineno))
+
+        lines += ['', '== hottest functions ==']
+        out = io.StringIO()
+        stats.stream = out
+        stats.sort_stats('cumulative').print_stats(self.top)
+        lines.append(out.getvalue().strip())
+        if snapshot is not None:
+            lines += ['', '== largest allocation sites ==']
+            for stat in snapshot.statistics('lineno')[:self.top]:
+                lines.append('  ' + str(stat))
+        return '\n'.join(lines) + '\n'
+
+
+def _owned(stats, callees, keys):
+    """Return `keys` and the functions only called from them, directly or
+    not"""
+    owned = set(keys)
+    stack = list(keys)
+    while stack:
+        for key in callees.get(stack.pop(), ()):
+            if key not in owned and all(caller in owned or caller == key
+                                        for caller in stats[key][4]):
+                owned.add(key)
+                stack.append(key)
+    return owned
+
+
+def _function_at(starts, filename, lineno):
+    """Return the key of the profiled function of `filename` starting last
+    at or before `lineno`"""
+    functions = starts.get(filename)
+    if not functions:
+        return None
+    i = bisect.bisect_left(functions, (lineno + 1,)) - 1
+    return functions[i][1] if i >= 0 else None
+
+
+def _size(n):
+    for unit in ('B', 'KiB', 'MiB'):
+        if abs(n) < 1024:
+            return '{:.1f} {}'.format(n, unit)
+        n /= 1024
+    return '{:.1f} GiB'.format(n)
+
+
+def run_profiled(profile, name, function, *args, **kwargs):
+    """Call `function` under `profile`, a `Profiler` or a directory"""
+    if not isinstance(profile, Profiler):
+        profile = Profiler(profile, name)
+    with profile:
+        return function(*args, **kwargs)
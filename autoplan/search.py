@@ -0,0 +1,424 @@
+import heapq
+import itertools
+import math
+from collections import deque
+from .heuristics import Heuristic
+from .heuristics import FFHeuristic
+from .heuristics import HeuristicCache
+from .limits import SearchLimits
+from .planning_graph import RelaxedPlanningGraph
+
+
+class Plan:
+    """A sequential plan
+
+    Iterating over a plan yields `(action, state)` pairs where `state` is the
+    state reached by applying `action`.
+
+    Example
+    --------
+
+        plan = breadth_first_search(problem, init, goal)
+        for action, state in plan:
+            print(action.name)
+        plan.cost
+
+    """
+    def __init__(self, steps=()):
+        self.steps = list(steps)
+
+    @property
+    def actions(self):
+        return [a for a, _ in self.steps]
+
+    @property
+    def cost(self):
+        return sum(getattr(a, 'cost', 1) for a, _ in self.steps)
+
+    def __iter__(self):
+        return iter(self.steps)
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __getitem__(self, index):
+        return self.steps[index]
+
+    def __repr__(self):
+        return 'Plan([{}])'.format(', '.join(a.name for a, _ in self.steps))
+
+
+def graph_search(problem, init=[], goal=[], lifo=False, limits=None,
+                 stats=None):
+    # type: (Domain) -> Plan
+    """Blind graph search over the compiled task of `problem`
+
+    Expands states in LIFO (depth-first) or FIFO (breadth-first) order.
+    Each distinct state is stored once, with a pointer to the state and
+    action it was first generated from; duplicates are dropped as soon as
+    they are generated.  `limits` is an optional `SearchLimits` and `stats`
+    an optional `SearchStatistics`.
+
+    """
+    if stats is not None:
+        return stats.run(problem, 'search', _graph_search, problem, init,
+                         goal, lifo, limits, stats)
+    return _graph_search(problem, init, goal, lifo, limits, None)
+
+
+def _graph_search(problem, init, goal, lifo, limits, stats):
+    task = problem.compile()
+    init_set, rest = task.split(problem.prune_static(init, init=True))
+    goal_set, goal_rest = task.split(problem.prune_static(goal))
+    if not goal_rest.issubset(rest):
+        return None
+
+    parents = {init_set: None}
+    if goal_set & init_set == goal_set:
+        return extract_plan(task, parents, init_set, rest)
+    open_nodes = deque([init_set])
+    pop = open_nodes.pop if lifo else open_nodes.popleft
+
+    while open_nodes:
+        if stats is not None:
+            stats.frontier(len(open_nodes))
+        state = pop()
+        if limits is not None and limits.expand():
+            return None
+        if stats is not None:
+            stats.expanded += 1
+            stats.emit('expand', state)
+        for a in task.applicable(state):
+            new_state = task.successor(state, a)
+            if stats is not None:
+                stats.generated += 1
+                stats.emit('generate', new_state)
+            if new_state in parents:
+                if stats is not None:
+                    stats.duplicates += 1
+                continue
+            parents[new_state] = (state, a)
+            if goal_set & new_state == goal_set:
+                return extract_plan(task, parents, new_state, rest)
+            open_nodes.append(new_state)
+    return None
+
+
+def best_first_search(problem, heuristic, init=[], goal=[], weight=1,
+                      greedy=False, lazy=False, tie_breaking='low_h',
+                      preferred=False, cache=None, limits=None, bound=None,
+                      stats=None):
+    # type: (Domain, Callable) -> Plan
+    """Best-first search over the compiled task of `problem`
+
+    Nodes are ordered by `f = g + weight * h`, or by `h` alone if `greedy`
+    is set, where `g` sums the `cost` of the actions on the path.
+    `heuristic` is a `Heuristic` of `autoplan.heuristics` or any callable
+    `heuristic(state, goal)` taking frozensets of states; see
+    `make_evaluator`.  For instance:
+
+        plan = astar_search(problem, MaxHeuristic(problem), init, goal)
+
+        rpg = RelaxedPlanningGraph(problem)
+        h = functools.partial(rpg_heuristic, rpg)
+        plan = greedy_best_first_search(problem, h, init, goal)
+
+    With eager evaluation a state is evaluated when it is generated.  With
+    `lazy` evaluation successors are queued with the value of their parent
+    and evaluated only when they are expanded.
+
+    Ties on `f` are broken by `tie_breaking`: 'low_h' prefers the lower
+    heuristic value, 'high_g' the deeper node, 'fifo' and 'lifo' the
+    insertion order.
+
+    With `preferred`, states reached through the helpful actions of their
+    parent (see `make_helpful`) are also queued in a second open list, and
+    the two lists are expanded alternately.
+
+    `cache` is an optional `HeuristicCache` consulted before evaluating a
+    state, and `limits` an optional `SearchLimits`.  With `bound`, paths
+    costing `bound` or more are pruned, so only plans cheaper than `bound`
+    are found.  `stats` is an optional `SearchStatistics`.
+
+    """
+    if tie_breaking not in _TIE_BREAKING:
+        raise ValueError("Unknown tie breaking: {}".format(tie_breaking))
+    tie = _TIE_BREAKING[tie_breaking]
+    args = (problem, heuristic, init, goal, weight, greedy, lazy, tie,
+            preferred, cache, limits, bound, stats)
+    if stats is not None:
+        return stats.run(problem, 'search', _best_first_search, *args)
+    return _best_first_search(*args)
+
+
+def _best_first_search(problem, heuristic, init, goal, weight, greedy, lazy,
+                       tie, preferred, cache, limits, bound, stats):
+    task = problem.compile()
+    init_set, rest = task.split(problem.prune_static(init, init=True))
+    goal_states = problem.prune_static(goal)
+    goal_set, goal_rest = task.split(goal_states)
+    if not goal_rest.issubset(rest):
+        return None
+
+    h_values = {}
+    infos = {}
+    heuristic_function = heuristic
+    heuristic = make_evaluator(task, heuristic, goal_states, rest)
+    if stats is not None:
+        heuristic = stats.evaluator(heuristic)
+    helpful = None
+    if preferred:
+        helpful = make_helpful(task, heuristic_function)
+        if helpful is None:
+            raise ValueError("Heuristic does not compute helpful actions")
+    if cache is not None:
+        heuristic, helpful = cache_evaluator(cache, heuristic, helpful,
+                                             goal_set)
+    if helpful is not None:
+        capture, select = helpful
+
+    def evaluate(state):
+        if state not in h_values:
+            h_values[state] = heuristic(state)
+            if helpful is not None:
+                infos[state] = capture()
+        return h_values[state]
+
+    def priority(g, h):
+        return h if greedy else g + weight * h
+
+    counter = itertools.count()
+    h = evaluate(init_set)
+    if h == math.inf or bound is not None and bound <= 0:
+        return None
+    parents = {init_set: None}
+    best_g = {init_set: 0}
+    expanded = {}
+    entry = (priority(0, h), tie(0, h, next(counter)), 0, h, init_set)
+    queues = [[entry], []]
+    turn = 0
+
+    while queues[0] or queues[1]:
+        turn += 1
+        open_nodes = queues[turn % 2]
+        if not open_nodes:
+            open_nodes = queues[(turn + 1) % 2]
+        if stats is not None:
+            stats.frontier(len(queues[0]) + len(queues[1]))
+        _, _, g, h, state = heapq.heappop(open_nodes)
+        if g > best_g[state] or expanded.get(state, math.inf) <= g:
+            continue
+        expanded[state] = g
+        if limits is not None and limits.expand():
+            return None
+        if stats is not None:
+            stats.expanded += 1
+            stats.emit('expand', state)
+        if lazy:
+            h = evaluate(state)
+            if h == math.inf:
+                continue
+        if goal_set & state == goal_set:
+            return extract_plan(task, parents, state, rest)
+        actions = task.applicable(state)
+        helpful_actions = ()
+        if helpful is not None:
+            helpful_actions = set(select(infos[state], actions))
+        for a in actions:
+            new_state = task.successor(state, a)
+            new_g = g + task.costs[a]
+            if stats is not None:
+                stats.generated += 1
+                stats.emit('generate', new_state)
+            if new_state in best_g and best_g[new_state] <= new_g:
+                if stats is not None:
+                    stats.duplicates += 1
+                continue
+            if bound is not None and new_g >= bound:
+                continue
+            new_h = h if lazy else evaluate(new_state)
+            if new_h == math.inf:
+                continue
+            best_g[new_state] = new_g
+            parents[new_state] = (state, a)
+            entry = (priority(new_g, new_h), tie(new_g, new_h, next(counter)),
+                     new_g, new_h, new_state)
+            heapq.heappush(queues[0], entry)
+            if a in helpful_actions:
+                heapq.heappush(queues[1], entry)
+    return None
+
+
+_TIE_BREAKING = {
+    'low_h': lambda g, h, n: (h, n),
+    'high_g': lambda g, h, n: (-g, n),
+    'fifo': lambda g, h, n: n,
+    'lifo': lambda g, h, n: -n,
+}
+
+
+def astar_search(problem, heuristic, init=[], goal=[], **kwargs):
+    # type: (Domain, Callable) -> Plan
+    """A* search, optimal for admissible heuristics"""
+    return best_first_search(problem, heuristic, init, goal, **kwargs)
+
+
+def weighted_astar_search(problem, heuristic, init=[], goal=[], weight=5,
+                          **kwargs):
+    # type: (Domain, Callable) -> Plan
+    """Weighted A* search, `f = g + weight * h`"""
+    return best_first_search(problem, heuristic, init, goal, weight=weight,
+                             **kwargs)
+
+
+def greedy_best_first_search(problem, heuristic, init=[], goal=[], **kwargs):
+    # type: (Domain, Callable) -> Plan
+    """Greedy best-first search ordered by the heuristic value only"""
+    return best_first_search(problem, heuristic, init, goal, greedy=True,
+                             **kwargs)
+
+
+def anytime_search(problem, heuristic=None, init=[], goal=[],
+                   weights=(5, 3, 2, 1.5, 1), time_limit=None, cancel=None,
+                   callback=None, limits=None, stats=None):
+    # type: (Domain, Callable) -> Plan
+    """Restarting weighted A*, improving the plan until the budget runs out
+
+    A first plan is found by greedy best-first search, with preferred
+    operators when `heuristic` supports them.  Weighted A* is then restarted
+    with each of `weights` in turn, the last one repeating, pruning paths
+    not cheaper than the best plan so far.  All the searches share one
+    `HeuristicCache`.  When a search exhausts its open list without a plan,
+    the best plan is optimal and is returned at once.
+
+    `heuristic` defaults to `FFHeuristic(problem)`.  The searches stop at
+    `time_limit` seconds or when `cancel` is set; `limits` may give a
+    `SearchLimits` instead.  `callback(plan)` is called with each new best
+    plan.  `stats`, a `SearchStatistics`, accumulates over all the
+    searches.  Returns the best plan found, or None.
+
+    Example
+    --------
+
+        plan = anytime_search(problem, init=init, goal=goal, time_limit=2,
+                              callback=lambda p: print(p.cost))
+
+    """
+    if heuristic is None:
+        heuristic = FFHeuristic(problem)
+    if limits is None:
+        limits = SearchLimits(time_limit, cancel=cancel)
+    cache = HeuristicCache()
+    preferred = make_helpful(problem.compile(), heuristic) is not None
+    best = greedy_best_first_search(problem, heuristic, init, goal,
+                                    preferred=preferred, cache=cache,
+                                    limits=limits, stats=stats)
+    if best is None:
+        return None
+    if callback is not None:
+        callback(best)
+
+    i = 0
+    while not limits.exceeded():
+        weight = weights[min(i, len(weights) - 1)]
+        i += 1
+        plan = weighted_astar_search(problem, heuristic, init, goal,
+                                     weight=weight, cache=cache,
+                                     limits=limits, bound=best.cost,
+                                     stats=stats)
+        if plan is None:
+            if not limits.exceeded():
+                break
+        else:
+            best = plan
+            if callback is not None:
+                callback(best)
+    return best
+
+
+def make_evaluator(task, heuristic, goal, rest=frozenset()):
+    """Return a function computing the heuristic value of a state of `task`
+
+    A `Heuristic` bound to `task` is evaluated on bitmasks directly.  Any
+    other callable is called as `heuristic(state, goal)` with the decoded
+    state, including the facts in `rest`.  None is mapped to `math.inf`,
+    which marks a dead end.
+
+    """
+    goal = frozenset(goal)
+    if isinstance(heuristic, Heuristic) and heuristic.task is task:
+        goal_set = task.encode(goal)
+        return lambda state: heuristic.evaluate(state, goal_set)
+
+    def evaluate(state):
+        h = heuristic(task.decode(state) | rest, goal)
+        return math.inf if h is None else h
+    return evaluate
+
+
+def make_helpful(task, heuristic):
+    """Return `(capture, select)` for the helpful actions of `heuristic`
+
+    `capture()`, called right after evaluating a state, returns what the
+    evaluation found out about helpful actions, and
+    `select(info, actions)` keeps the helpful ones among the ids of the
+    actions applicable in that state.  Supported heuristics are
+    `FFHeuristic` bound to `task` and `RelaxedPlanningGraph`; returns None
+    for any other heuristic.
+
+    """
+    if isinstance(heuristic, FFHeuristic) and heuristic.task is task:
+        return (lambda: heuristic.helpful_facts,
+                lambda mask, actions: [a for a in actions
+                                       if task.add_effects[a] & mask])
+    if isinstance(heuristic, RelaxedPlanningGraph):
+        return (lambda: heuristic.helpful_actions,
+                lambda helpful, actions: [a for a in actions
+                                          if task.actions[a] in helpful])
+    return None
+
+
+def cache_evaluator(cache, evaluate, helpful, goal):
+    """Route `evaluate` and `helpful` through a `HeuristicCache`
+
+    `evaluate` and `helpful` are as returned by `make_evaluator` and
+    `make_helpful`; `helpful` may be None.  `goal` is the goal bitmask,
+    which is part of the cache key.  With `helpful`, entries stored without
+    helpful information, by a search that did not ask for it, are
+    evaluated again.  Returns the wrapped pair.
+
+    """
+    last = [None]
+    capture = helpful[0] if helpful is not None else lambda: None
+
+    def complete(entry):
+        return entry[1] is not None
+
+    def cached_evaluate(state):
+        key = (goal, state)
+        entry = cache.get(key, complete if helpful is not None else None)
+        if entry is None:
+            entry = (evaluate(state), capture())
+            cache.put(key, entry)
+        last[0] = entry[1]
+        return entry[0]
+
+    if helpful is not None:
+        helpful = (lambda: last[0], helpful[1])
+    return cached_evaluate, helpful
+
+
+def extract_plan(task, parents, state, rest=frozenset()):
+    """Follow parent pointers from `state` back to the initial state
+
+    `parents` maps a state of `task` to `(parent_state, action_id)`, or to
+    None for the initial state.  `rest` is added to every decoded state.
+
+    """
+    steps = []
+    while parents[state] is not None:
+        parent, a = parents[state]
+        steps.append((task.actions[a], task.decode(state) | rest))
+        state = parent
+    steps.reverse()
+    return Plan(steps)
@@ -0,0 +1,114 @@
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+class SearchStatistics:
+    """Counters, timings and hooks of a planner run
+
+    Planners given a `stats` instance fill in the counters that apply to
+    them:
+
+    - `expanded`, `generated` and `duplicates` nodes, and the
+      `peak_frontier` size of searches;
+    - `evaluations` of the heuristic and the `evaluation_time` they took,
+      cache hits excluded;
+    - the number of `levels` of planning graphs, and the numbers of state
+      and action mutex pairs of each level in `mutex_states` and
+      `mutex_actions`;
+    - `timings` in seconds per phase: 'grounding' (copied from the
+      domain), 'search', 'expansion' and 'extraction'.
+
+    Callbacks added with `add_hook` are called on the events 'expand'
+    `(state)`, 'generate' `(state)`, 'evaluate' `(state, h)`, 'level'
+    `(index, level)` and 'plan' `(plan)`.  Search states are passed as
+    bitmasks of the compiled task.  An instance can be shared by successive
+    runs, whose counts add up.
+
+    Example
+    --------
+
+        stats = SearchStatistics()
+        stats.add_hook('plan', lambda plan: print(plan.cost))
+        plan = astar_search(problem, h, init, goal, stats=stats)
+        stats.expanded, stats.timings['search'], stats.as_dict()
+
+    """
+    def __init__(self):
+        self.expanded = 0
+        self.generated = 0
+        self.duplicates = 0
+        self.peak_frontier = 0
+        self.evaluations = 0
+        self.evaluation_time = 0.0
+        self.levels = 0
+        self.mutex_states = []
+        self.mutex_actions = []
+        self.timings = defaultdict(float)
+        self.hooks = defaultdict(list)
+
+    def add_hook(self, event, callback):
+        self.hooks[event].append(callback)
+
+    def emit(self, event, *args):
+        for callback in self.hooks.get(event, ()):
+            callback(*args)
+
+    def frontier(self, size):
+        """Record a frontier of `size` nodes"""
+        if size > self.peak_frontier:
+            self.peak_frontier = size
+
+    @contextmanager
+    def phase(self, name):
+        """Add the time spent in the `with` block to `timings[name]`"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.perf_counter() - start
+
+    def run(self, problem, phase, function, *args, **kwargs):
+        """Call `function`, timed as `phase`, and emit 'plan' for its result
+
+        Also copies the grounding time of `problem`.
+
+        """
+        self.timings['grounding'] = getattr(problem, 'grounding_time', 0.0)
+        with self.phase(phase):
+            plan = function(*args, **kwargs)
+        if plan is not None:
+            self.emit('plan', plan)
+        return plan
+
+    def evaluator(self, evaluate):
+        """Wrap a state evaluation function to count and time its calls"""
+        def timed(state):
+            start = time.perf_counter()
+            h = evaluate(state)
+            self.evaluation_time += time.perf_counter() - start
+            self.evaluations += 1
+            if 'evaluate' in self.hooks:
+                self.emit('evaluate', state, h)
+            return h
+        return timed
+
+    def as_dict(self):
+        """Return the counters and timings as a JSON-serialisable dict"""
+        return {
+            'expanded': self.expanded,
+            'generated': self.generated,
+            'duplicates': self.duplicates,
+            'peak_frontier': self.peak_frontier,
+            'evaluations': self.evaluations,
+            'evaluation_time': self.evaluation_time,
+            'levels': self.levels,
+            'mutex_states': list(self.mutex_states),
+            'mutex_actions': list(self.mutex_actions),
+            'timings': dict(self.timings),
+        }
+
+    def __repr__(self):
+        return ('SearchStatistics(expanded={}, generated={}, evaluations={}, '
+                'levels={})'.format(self.expanded, self.generated,
+                                    self.evaluations, self.levels))
@@ -1,15 +1,55 @@
 #!/usr/bin/env python3
 
-import copy
+import array
+import hashlib
+import logging
+import os
+import time
+import weakref
+import concurrent.futures
 from typing import List, Dict
 from pprint import pprint
 import itertools
 from .planning_graph import PlanningGraph
 from .planning_graph import RelaxedPlanningGraph
-import heapq
-
-
-class State:
+from .task import Task
+from .task import _fact_key
+from .search import Plan
+from .search import graph_search
+from .search import best_first_search
+from .search import astar_search
+from .search import weighted_astar_search
+from .search import greedy_best_first_search
+from .search import anytime_search
+from .search import extract_plan
+from .search import make_evaluator
+from .search import make_helpful
+from .search import cache_evaluator
+from .heuristics import Heuristic
+from .heuristics import MaxHeuristic
+from .heuristics import AdditiveHeuristic
+from .heuristics import FFHeuristic
+from .heuristics import HeuristicCache
+from .limits import SearchLimits
+from .stats import SearchStatistics
+from .log import TRACE
+from .profiling import Profiler
+from .profiling import run_profiled
+from collections import defaultdict
+from collections import deque
+
+
+logger = logging.getLogger(__name__)
+
+
+class _StateMeta(type):
+    """Give every state class empty `__slots__` unless it defines its own"""
+    def __new__(mcs, name, bases, namespace):
+        namespace.setdefault('__slots__', ())
+        return super().__new__(mcs, name, bases, namespace)
+
+
+class State(metaclass=_StateMeta):
     """A state
 
     Example
@@ -22,24 +62,39 @@ class State:
         # Create a state instance
         o = On('block-1', 'block-2')
 
+    States are immutable and interned: creating a state equal to an
+    existing one returns that instance, so every action mentioning a fact
+    shares the same object.  `args` is a tuple.
+
     """
-    def __init__(self, *args):
-        if len(args) != len(self.variables):
+    __slots__ = ('args', '_hash', '__weakref__')
+    _interned = weakref.WeakValueDictionary()
+
+    def __new__(cls, *args):
+        if len(args) != len(cls.variables):
             raise ValueError("Length not match")
-        self.args = copy.deepcopy(self.variables)
-        self.bind(**dict(zip(self.variables, args)))
-        self._identifier = None
+        args = tuple(a if v.startswith('?') else v
+                     for v, a in zip(cls.variables, args))
+        self = State._interned.get((cls, args))
+        if self is None:
+            self = super().__new__(cls)
+            self.args = args
+            self._hash = None
+            if self.ground():
+                self._hash = hash((cls.__name__,) + args)
+            State._interned[(cls, args)] = self
+        return self
+
+    def __reduce__(self):
+        return (self.__class__, self.args)
 
     def ground(self):
         return all(not x.startswith('?') for x in self.args)
 
     def bind(self, **kwargs):
-        for i, a in enumerate(self.args):
-            if a.startswith('?'):
-                if a in kwargs:
-                    self.args[i] = kwargs[a]
-        if self.ground():
-            self._hash = hash(tuple([self.__class__.__name__, *self.args]))
+        """Return this state with the variables in `kwargs` replaced"""
+        return self.__class__(*(kwargs.get(a, a) if a.startswith('?') else a
+                                for a in self.args))
 
     @property
     def name(self):
@@ -57,13 +112,64 @@ class State:
         return self._hash
 
     def __eq__(self, other):
-        return hash(self) == hash(other)
+        if self is other:
+            return True
+        return (isinstance(other, State) and self._hash == other._hash and
+                self.args == other.args and
+                self.__class__.__name__ == other.__class__.__name__)
 
     def __repr__(self):
         return "{}({})".format(self.__class__.__name__, ', '.join(self.args))
 
 
-class Action:
+class _Templates:
+    """Precondition or effect attribute of a schema
+
+    On the schema class it is the list of template states.  On a ground
+    action it is the frozenset of ground states held in the slot `member`.
+
+    """
+    __slots__ = ('templates', 'member')
+
+    def __init__(self, templates, member):
+        self.templates = templates
+        self.member = member
+
+    def __get__(self, obj, cls=None):
+        if obj is None:
+            return self.templates
+        return self.member.__get__(obj, cls)
+
+
+class _ActionMeta(type):
+    """Give every schema empty `__slots__` and wrap its preconditions and
+    effects in `_Templates`"""
+    def __new__(mcs, name, bases, namespace):
+        namespace.setdefault('__slots__', ())
+        cls = super().__new__(mcs, name, bases, namespace)
+        for attr in ('preconditions', 'add_effects', 'del_effects'):
+            if attr in namespace:
+                setattr(cls, attr, _Templates(namespace[attr],
+                                              getattr(Action, '_' + attr)))
+        return cls
+
+
+def _bind(templates, bindings):
+    """Return the frozenset of the `templates` states ground by `bindings`"""
+    states = []
+    for state in templates:
+        args = []
+        for var in state.args:
+            if var.startswith('?'):
+                if var not in bindings:
+                    raise KeyError("No such variable: {}".format(var))
+                var = bindings[var]
+            args.append(var)
+        states.append(state.__class__(*args))
+    return frozenset(states)
+
+
+class Action(metaclass=_ActionMeta):
     """
 
     Example
@@ -82,70 +188,68 @@ class Action:
         # Create an action instance
         m = Move('block-1', 'block-2', 'block-3')
 
+    Set `allow_repeated_args = True` on a schema to let grounding (see
+    `Domain`) bind one object to several of its variables.
+
+    Ground actions are immutable and slotted: `args` is the tuple of their
+    arguments, and `preconditions`, `add_effects` and `del_effects` are
+    frozensets of ground states, while the same attributes of the schema
+    class hold its templates.  Ground actions are equal when they have the
+    same schema name and arguments.
+
     """
+    __slots__ = ('args', '_hash', '_preconditions', '_add_effects',
+                 '_del_effects')
+    allow_repeated_args = False
+
     def __init__(self, *args):
-        self._tuple =  tuple([self.__class__.__name__, *args])
-        self._hash = hash(self._tuple)
-
-        self.bindings = dict(zip(self.variables, args))
-
-        preconditions = []
-        for state in self.preconditions:
-            s = copy.deepcopy(state)
-            args = {}
-            for var in state.args:
-                if var.startswith('?'):
-                    if var in self.bindings:
-                        args[var] = self.bindings[var]
-                    else:
-                        raise KeyError("No such variable: {}".format(var))
-            s.bind(**args)
-            preconditions.append(s)
-        self.preconditions = frozenset(preconditions)
-
-        add_effects = []
-        for state in self.add_effects:
-            s = copy.deepcopy(state)
-            args = {}
-            for var in state.args:
-                if var.startswith('?'):
-                    if var in self.bindings:
-                        args[var] = self.bindings[var]
-                    else:
-                        raise KeyError("No such variable: {}".format(var))
-            s.bind(**args)
-            add_effects.append(s)
-        self.add_effects = frozenset(add_effects)
-
-        del_effects = []
-        for state in self.del_effects:
-            s = copy.deepcopy(state)
-            args = {}
-            for var in state.args:
-                if var.startswith('?'):
-                    if var in self.bindings:
-                        args[var] = self.bindings[var]
-                    else:
-                        raise KeyError("No such variable: {}".format(var))
-            s.bind(**args)
-            del_effects.append(s)
-        self.del_effects = frozenset(del_effects)
+        bindings = dict(zip(self.variables, args))
+        self._init(args, _bind(type(self).preconditions, bindings), bindings)
+
+    @classmethod
+    def _ground(cls, args, preconditions):
+        """Return the ground action of `args` with `preconditions`, e.g.
+        with the static ones pruned, in place of the bound templates"""
+        self = cls.__new__(cls)
+        self._init(args, preconditions, dict(zip(cls.variables, args)))
+        return self
+
+    def _init(self, args, preconditions, bindings):
+        cls = type(self)
+        setter = object.__setattr__
+        setter(self, 'args', args)
+        setter(self, '_hash', hash((cls.__name__,) + args))
+        setter(self, '_preconditions', frozenset(preconditions))
+        setter(self, '_add_effects', _bind(cls.add_effects, bindings))
+        setter(self, '_del_effects', _bind(cls.del_effects, bindings))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Ground actions are immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Ground actions are immutable")
+
+    def __reduce__(self):
+        return (self.__class__._ground, (self.args, self.preconditions))
 
     @property
     def name(self):
-        cls = self.__class__.__name__
-        args = [self.bindings[k] for k in self.variables]
-        return '{}({})'.format(cls, ', '.join(args))
+        return '{}({})'.format(self.__class__.__name__, ', '.join(self.args))
 
     @property
     def safe_name(self):
-        cls = self.__class__.__name__
-        args = [self.bindings[k] for k in self.variables]
-        return '{}_{}_'.format(cls, '_'.join(args))
+        return '{}_{}_'.format(self.__class__.__name__, '_'.join(self.args))
 
     def __hash__(self):
         return self._hash
 
+    def __eq__(self, other):
+        return self is other or (isinstance(other, Action) and
+                                 self._hash == other._hash and
+                                 self.args == other.args and
+                                 self.__class__.__name__ ==
+                                 other.__class__.__name__)
+
     def __repr__(self):
         buf = []
         buf.append('{} {{'.format(self.name))
@@ -164,141 +268,635 @@ class Action:
 
 
 class Domain:
-    """
+    """A planning domain grounded over its objects
 
     Example
     --------
 
+        class BlocksWorld(Domain):
+            objects = ['R', 'G', 'B']
+            predicates = [On, OnTable, Clear]
+            actions = [Move, ToTable, FromTable]
+
+        # Ground every permutation of objects
+        problem = BlocksWorld()
+
+        # Ground only the actions reachable from an initial state
+        problem = BlocksWorld(init=[On('R', 'B'), OnTable('B'), Clear('R')])
+
+    With `init`, grounding runs a relaxed (delete-free) reachability
+    analysis: an action is instantiated only when all of its preconditions
+    are reachable from `init`, and `ground_states` holds the reachable
+    facts.
+
+    Predicates that appear in no add or delete effect are static.  Objects
+    can be typed by unary static predicates:
+
+        class Logistics(Domain):
+            objects = ['truck1', 'office1', 'airport1']
+            types = {Truck: ['truck1'], Location: ['office1', 'airport1']}
+            ...
+
+    Static facts whose truth is known at grounding time, i.e. typed facts
+    and, with `init`, every static fact of `init`, filter the candidate
+    objects of each action parameter.  They are then dropped from ground
+    preconditions and from `ground_states`; use `prune_static` to drop them
+    from search states as well.  A domain grounded with `init` therefore
+    only works for that init, or one with the same static facts: searches
+    from an init with other static facts raise ValueError.
+
+    Without `init`, grounding can run in `workers` processes: the bindings
+    of each schema are split by the value of its first parameter, workers
+    return the fact ids of the ground actions in the compact layout of
+    `Task.save`, and the compiled `Task` is assembled from them in the
+    order of sequential grounding.  Ground actions are then built on first
+    access, as for a cached task.
+    The domain and its schemas must be picklable, i.e. defined at the top
+    level of an importable module.
+
+        problem = BlocksWorld(workers=8)
+
+    With `cache_dir`, the compiled `Task` is saved there under the
+    `fingerprint` of the domain, and later instances with the same
+    fingerprint load it instead of grounding.  Their ground actions are
+    then built on first access.
+
+        problem = BlocksWorld(cache_dir='~/.cache/autoplan')
+
+    `grounding_init` holds the init given for grounding, or None, and
+    `grounding_time` the seconds spent grounding or loading the task.
+
     """
-    def __init__(self):
+    types = {}
+
+    def __init__(self, init=None, workers=None, cache_dir=None):
+        effects = set()
+        for act in self.actions:
+            effects.update(e.__class__ for e in act.add_effects)
+            effects.update(e.__class__ for e in act.del_effects)
+        preds = set(self.predicates)
+        preds.update(p.__class__ for act in self.actions
+                     for p in act.preconditions)
+        self.static_predicates = frozenset(preds - effects)
+
+        static_states = []
+        for pred, objs in self.types.items():
+            if pred not in self.static_predicates:
+                raise ValueError("Type predicate {} is modified by an action"
+                                 .format(pred.__name__))
+            static_states.extend(pred(o) for o in objs)
+        self._type_states = frozenset(static_states)
+        if init is None:
+            self._known_static = frozenset(self.types)
+        else:
+            self._known_static = self.static_predicates
+            static_states.extend(s for s in init
+                                 if s.__class__ in self.static_predicates)
+        self.static_states = frozenset(static_states)
+        self.grounding_init = None if init is None else frozenset(init)
+        self._task = None
+        start = time.perf_counter()
+        self._ground(init, workers, cache_dir)
+        self.grounding_time = time.perf_counter() - start
+
+    def _ground(self, init, workers, cache_dir):
+        if cache_dir is not None:
+            cache_dir = os.path.expanduser(cache_dir)
+            fingerprint = self.fingerprint(init)
+            path = os.path.join(cache_dir, fingerprint + '.task')
+            try:
+                self._task = Task.load(self, path, fingerprint)
+            except (OSError, ValueError):
+                pass
+            else:
+                self.ground_states = frozenset(self._task.facts)
+                self.ground_actions = self._task.actions
+                return
+
+        if init is None:
+            self._ground_all(workers)
+        else:
+            self._ground_reachable(init)
+
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            self.compile().save(path, fingerprint)
+
+    def fingerprint(self, init=None):
+        """Return a hex digest identifying the grounding of this domain
+
+        It covers the objects, types, predicates and schemas of the domain,
+        and `init` since reachability grounding depends on it.
+
+        """
+        def templates(states):
+            return sorted(repr(s) for s in states)
+
+        schemas = [(act.__name__, list(act.variables),
+                    templates(act.preconditions), templates(act.add_effects),
+                    templates(act.del_effects), getattr(act, 'cost', 1),
+                    act.allow_repeated_args)
+                   for act in self.actions]
+        key = [self.__class__.__name__, list(self.objects),
+               sorted((p.__name__, list(o)) for p, o in self.types.items()),
+               [(p.__name__, list(p.variables)) for p in self.predicates],
+               schemas, None if init is None else templates(init)]
+        return hashlib.sha256(repr(key).encode()).hexdigest()
+
+    def compile(self):
+        """Return the integer-indexed `Task` of this domain
+
+        The task is built on the first call and shared afterwards.
+
+        """
+        if self._task is None:
+            self._task = Task(self)
+        return self._task
+
+    def prune_static(self, states, init=False):
+        """Return `states` as a frozenset without the pruned static facts
+
+        With `init`, `states` is an initial state, whose known static facts
+        must be those assumed by grounding, typed facts aside; ValueError is
+        raised otherwise.
+
+        """
+        states = frozenset(states)
+        if init:
+            static = frozenset(s for s in states
+                               if s.__class__ in self._known_static)
+            unexpected = static - self.static_states
+            missing = self.static_states - self._type_states - static
+            if unexpected or missing:
+                raise ValueError(
+                    "Static facts of init differ from those of grounding: "
+                    "unexpected {}, missing {}".format(
+                        sorted(map(repr, unexpected)),
+                        sorted(map(repr, missing))))
+        return states - self.static_states
+
+    def _ground_all(self, workers=None):
         states = []
         for pred in self.predicates:
+            if pred in self._known_static:
+                continue
             nparams = len(pred.variables)
             for args in itertools.permutations(self.objects, nparams):
                 p = pred(*args)
                 states.append(p)
-        self.ground_states = frozenset(states)
 
-        actions = []
-        for act in self.actions:
-            nparams = len(act.variables)
-            for args in itertools.permutations(self.objects, nparams):
-                a = act(*args)
-                actions.append(a)
+        if not workers or workers <= 1:
+            actions = [a for i in range(len(self.actions))
+                       for a in _ground_schema(self, i)]
+        else:
+            # Ground before setting any large attribute, as the domain is
+            # sent to the workers
+            chunks = []
+            for i, act in enumerate(self.actions):
+                if act.variables:
+                    var = act.variables[0]
+                    chunks.extend((i, o) for o in self._candidates(act)[var])
+                else:
+                    chunks.append((i, None))
+            chunksize = max(1, len(chunks) // (workers * 4))
+            facts = sorted(set(states), key=_fact_key)
+            fact_ids = {s: i for i, s in enumerate(facts)}
+            with concurrent.futures.ProcessPoolExecutor(
+                    workers, initializer=_init_worker,
+                    initargs=(self, fact_ids)) as executor:
+                results = list(executor.map(_ground_rows, *zip(*chunks),
+                                            chunksize=chunksize))
+            self._task = _merge_rows(self.actions, facts, chunks, results)
+            actions = self._task.actions
+
+        self.ground_states = frozenset(states)
         self.ground_actions = actions
 
+    def _ground_reachable(self, init):
+        # Semi-naive fixpoint: after the first round, a schema is only
+        # matched with bindings using one of the facts of the last round
+        reached = set()
+        index = _FactIndex()
+        for s in itertools.chain(init, self.static_states):
+            if s not in reached:
+                reached.add(s)
+                index.add(s)
+
+        grounded = {}
+        delta = None
+        while True:
+            new = []
+            for i, act in enumerate(self.actions):
+                for args in _match_schema(act, index, delta, self.objects):
+                    if (i, args) in grounded:
+                        continue
+                    a = self._ground_action(act, args)
+                    grounded[(i, args)] = a
+                    for e in a.add_effects:
+                        if e not in reached:
+                            reached.add(e)
+                            new.append(e)
+            if not new:
+                break
+            delta = defaultdict(dict)
+            for e in new:
+                index.add(e)
+                delta[e.__class__][e.args] = None
+        self.ground_states = frozenset(reached) - self.static_states
+        self.ground_actions = [grounded[k] for k in sorted(grounded)]
+
+    def _candidates(self, act):
+        """Return the objects allowed for each variable of `act` by the known
+        unary static facts"""
+        candidates = {v: list(self.objects) for v in act.variables}
+        for pre in act.preconditions:
+            var = pre.args[0] if len(pre.args) == 1 else ''
+            if pre.__class__ in self._known_static and var.startswith('?'):
+                candidates[var] = [o for o in candidates[var]
+                                   if pre.__class__(o) in self.static_states]
+        return candidates
+
+    def _typed_bindings(self, act, first=None):
+        """Enumerate bindings of `act` allowed by the known unary static facts
+
+        With `first`, only the bindings of the first variable to `first`.
+
+        """
+        candidates = self._candidates(act)
+        if first is not None:
+            candidates[act.variables[0]] = [first]
+        nparams = len(act.variables)
+        for args in itertools.product(*(candidates[v] for v in act.variables)):
+            if act.allow_repeated_args or len(set(args)) == nparams:
+                yield args
+
+    def _ground_action(self, act, args):
+        """Return the action of the schema `act` ground by `args`, without its
+        known static preconditions, or None if one of them does not hold"""
+        bindings = dict(zip(act.variables, args))
+        preconditions = _bind(act.preconditions, bindings)
+        static = [p for p in preconditions
+                  if p.__class__ in self._known_static]
+        if not self.static_states.issuperset(static):
+            return None
+        return act._ground(args, preconditions.difference(static))
 
-def depth_first_search(problem, init=[], goal=[]):
-    # type: (Domain) -> List[(Action, State)]
-    init_set = frozenset(init)
-    goal_set = frozenset(goal)
-
-    open_nodes = [init_set]
-    closed_nodes = []
-    edges = []
-
-    while len(open_nodes) > 0:
-        state = open_nodes.pop()
-        for a in problem.ground_actions:
-            if a.preconditions.issubset(state):
-                new_state = (state | a.add_effects) - a.del_effects
-                edges.append((state, new_state, a))
-                if goal_set.issubset(new_state):
-                    s = new_state
-                    path = []
-                    while s != init_set:
-                        for src, dst, act in edges:
-                            if dst == s:
-                                s = src
-                                path.append((act, dst))
-                                break
-                    return reversed(path)
-                if new_state not in closed_nodes:
-                    open_nodes.append(new_state)
-        closed_nodes.append(state)
-    return None
 
+def _ground_schema(domain, i, first=None):
+    """Return the ground actions of the schema `domain.actions[i]`
+
+    With `first`, only those binding its first variable to `first`.
+
+    """
+    act = domain.actions[i]
+    actions = []
+    for args in domain._typed_bindings(act, first):
+        a = domain._ground_action(act, args)
+        if a is not None:
+            actions.append(a)
+    return actions
+
+
+# Domain and fact ids of a grounding worker, set by `_init_worker`
+_worker = None
+
+
+def _init_worker(domain, fact_ids):
+    global _worker
+    _worker = (domain, fact_ids)
+
+
+def _ground_rows(i, first):
+    """Ground a chunk of `_ground_schema` in a worker, as compact rows
+
+    Returns the arguments of the actions, the facts missing from the fact
+    ids of the worker, numbered after them, and the CSR arrays of the fact
+    ids of the preconditions, add effects and delete effects of the
+    actions, as read by `Task._from_rows`.
+
+    """
+    domain, fact_ids = _worker
+    rows = []
+    extra = {}
+    arrays = [array.array('I', [0]) if k % 2 == 0 else array.array('I')
+              for k in range(6)]
+    for a in _ground_schema(domain, i, first):
+        rows.append(a.args)
+        for k, states in enumerate((a.preconditions, a.add_effects,
+                                    a.del_effects)):
+            ids = arrays[2 * k + 1]
+            for s in states:
+                f = fact_ids.get(s)
+                if f is None:
+                    f = extra.setdefault(s, len(fact_ids) + len(extra))
+                ids.append(f)
+            arrays[2 * k].append(len(ids))
+    return rows, list(extra), arrays
+
+
+def _merge_rows(schemas, facts, chunks, results):
+    """Return the `Task` of the rows returned by `_ground_rows` for `chunks`
+
+    `facts` are the sorted facts the workers numbered.  Facts the workers
+    added are merged in and the fact ids renumbered in that case.
 
-def breadth_first_search(problem, init=[], goal=[]):
-    # type: (Domain) -> List[(Action, State)]
-    init_set = frozenset(init)
-    goal_set = frozenset(goal)
-
-    open_nodes = [init_set]
-    closed_nodes = []
-    edges = []
-
-    while len(open_nodes) > 0:
-        state = open_nodes.pop(0)
-        for a in problem.ground_actions:
-            if a.preconditions.issubset(state):
-                new_state = (state | a.add_effects) - a.del_effects
-                edges.append((state, new_state, a))
-                if goal_set.issubset(new_state):
-                    s = new_state
-                    path = []
-                    while s != init_set:
-                        for src, dst, act in edges:
-                            if dst == s:
-                                s = src
-                                path.append((act, dst))
+    """
+    extra = set(s for _, chunk_extra, _ in results for s in chunk_extra)
+    if extra:
+        merged = sorted(itertools.chain(facts, extra), key=_fact_key)
+        merged_ids = {s: i for i, s in enumerate(merged)}
+        base = [merged_ids[s] for s in facts]
+        facts = merged
+    rows = []
+    costs = []
+    arrays = [array.array('I', [0]) if k % 2 == 0 else array.array('I')
+              for k in range(6)]
+    for (i, _), (chunk_rows, chunk_extra, chunk_arrays) in zip(chunks,
+                                                               results):
+        rows.extend((i,) + args for args in chunk_rows)
+        costs.extend([getattr(schemas[i], 'cost', 1)] * len(chunk_rows))
+        if extra:
+            table = base + [merged_ids[s] for s in chunk_extra]
+        for k in (0, 2, 4):
+            offsets, ids = chunk_arrays[k], chunk_arrays[k + 1]
+            start = len(arrays[k + 1])
+            arrays[k].extend(start + o for o in offsets[1:])
+            arrays[k + 1].extend(ids if not extra else
+                                 [table[f] for f in ids])
+    return Task._from_rows(facts, schemas, rows, arrays, costs)
+
+
+class _FactIndex:
+    """Argument tuples of reached facts by state class, with hash indexes
+
+    `lookup` returns the tuples of a class whose arguments at `positions`
+    are `values`.  The index of a class and positions is built on its first
+    lookup and kept up to date by `add`.
+
+    """
+    def __init__(self):
+        self.facts = defaultdict(list)
+        self._indexes = defaultdict(dict)
+
+    def add(self, state):
+        args = state.args
+        self.facts[state.__class__].append(args)
+        for positions, index in self._indexes[state.__class__].items():
+            key = tuple([args[p] for p in positions])
+            index.setdefault(key, []).append(args)
+
+    def lookup(self, cls, positions, values):
+        if not positions:
+            return self.facts[cls]
+        indexes = self._indexes[cls]
+        index = indexes.get(positions)
+        if index is None:
+            index = indexes[positions] = {}
+            for args in self.facts[cls]:
+                key = tuple([args[p] for p in positions])
+                index.setdefault(key, []).append(args)
+        return index.get(values, ())
+
+
+def _match_schema(act, index, delta, objects):
+    """Enumerate bindings of `act` whose preconditions are all reached
+
+    `index` is the `_FactIndex` of the reached facts.  With `delta`, which
+    maps a state class to the argument tuples reached in the last round,
+    only bindings using at least one of these are enumerated, each once.
+    Returns argument tuples ordered as `act.variables`.  Variables that
+    appear in no precondition range over all `objects`.  Unless
+    `act.allow_repeated_args` is set, every variable is bound to a distinct
+    object.
+
+    """
+    distinct = not act.allow_repeated_args
+    preconditions = list(act.preconditions)
+    if delta is None:
+        seeds = [None]
+    else:
+        seeds = [k for k, pre in enumerate(preconditions)
+                 if pre.__class__ in delta]
+
+    result = []
+    for seed in seeds:
+        bindings = [{}]
+        bound = set()
+        remaining = list(range(len(preconditions)))
+        while remaining and bindings:
+            # Join the seed first, then the most constrained precondition
+            if seed in remaining:
+                j = seed
+            else:
+                j = min(remaining, key=lambda j: (
+                    -sum(1 for x in preconditions[j].args
+                         if x in bound or not x.startswith('?')),
+                    len(index.facts[preconditions[j].__class__])))
+            remaining.remove(j)
+            pre = preconditions[j]
+            cls = pre.__class__
+            # Facts of the last round are left to the seeds before this one
+            older = ()
+            if seed is not None and j < seed:
+                older = delta.get(cls, ())
+            if j == seed:
+                keys = ()
+            else:
+                keys = tuple(p for p, x in enumerate(pre.args)
+                             if x in bound or not x.startswith('?'))
+            free = [(p, x) for p, x in enumerate(pre.args) if p not in keys]
+            new_bindings = []
+            for b in bindings:
+                if j == seed:
+                    candidates = delta[cls]
+                else:
+                    candidates = index.lookup(
+                        cls, keys, tuple([b.get(pre.args[p], pre.args[p])
+                                          for p in keys]))
+                for values in candidates:
+                    if values in older:
+                        continue
+                    nb = dict(b)
+                    for p, var in free:
+                        value = values[p]
+                        if var.startswith('?'):
+                            if var in nb:
+                                if nb[var] != value:
+                                    break
+                            elif distinct and value in nb.values():
                                 break
-                    return reversed(path)
-                if new_state not in closed_nodes:
-                    open_nodes.append(new_state)
-        closed_nodes.append(state)
-    return None
+                            else:
+                                nb[var] = value
+                        elif var != value:
+                            break
+                    else:
+                        new_bindings.append(nb)
+            bindings = new_bindings
+            bound.update(x for x in pre.args if x.startswith('?'))
+
+        for b in bindings:
+            unbound = [v for v in act.variables if v not in b]
+            if not unbound:
+                result.append(tuple([b[v] for v in act.variables]))
+                continue
+            if distinct:
+                unused = [o for o in objects if o not in b.values()]
+                candidates = itertools.permutations(unused, len(unbound))
+            else:
+                candidates = itertools.product(objects, repeat=len(unbound))
+            for values in candidates:
+                nb = dict(b)
+                nb.update(zip(unbound, values))
+                result.append(tuple(nb[v] for v in act.variables))
+    return result
+
+
+def depth_first_search(problem, init=[], goal=[], limits=None, stats=None,
+                       profile=None):
+    # type: (Domain) -> Plan
+    if profile is not None:
+        return run_profiled(profile, 'depth_first_search', depth_first_search,
+                            problem, init, goal, limits, stats)
+    return graph_search(problem, init, goal, lifo=True, limits=limits,
+                        stats=stats)
+
+
+def breadth_first_search(problem, init=[], goal=[], limits=None, stats=None,
+                         profile=None):
+    # type: (Domain) -> Plan
+    if profile is not None:
+        return run_profiled(profile, 'breadth_first_search',
+                            breadth_first_search, problem, init, goal, limits,
+                            stats)
+    return graph_search(problem, init, goal, lifo=False, limits=limits,
+                        stats=stats)
 
 
 def rpg_heuristic(rpg, init, goal):
-    rpg.reset(init, goal)
-    return len(rpg.solve())
+    return rpg(init, goal)
 
-def _search_better_state(problem, rpg, init, goal):
+def _search_better_state(problem, evaluate, init, goal, rest=frozenset(),
+                         helpful=None, limits=None, stats=None):
     """Search a state that has a better heuristic value with breadth first search
+
+    `init` and the `goal` mask are states of the compiled task, `rest` holds
+    the facts unknown to it and `evaluate` maps a state to its heuristic
+    value.  With `helpful`, as returned by `make_helpful`, only helpful
+    actions are expanded.  Returns the path to that state, or to the first
+    goal state generated, the state and its heuristic value, or None if
+    there is none or `limits` are exceeded.
+
     """
-    h = rpg_heuristic(rpg, init, goal)
-    open_nodes = [init]
-    edges = []
-    closed_nodes = set()
+    task = problem.compile()
+    trace = logger.isEnabledFor(TRACE)
+    h = evaluate(init)
+    open_nodes = deque([init])
+    parents = {init: None}
+    infos = {}
+    if helpful is not None:
+        capture, select = helpful
+        infos[init] = capture()
     while open_nodes:
-        s = open_nodes.pop(0)
-        for a in problem.ground_actions:
-            if a.preconditions.issubset(s):
-                new_s = (s | a.add_effects) - a.del_effects
-                new_h = rpg_heuristic(rpg, new_s, goal)
-                edges.append((s, new_s, a, new_h))
-                if new_h < h:
-                    print('h = ', new_h)
-                    path = []
-                    x = new_s
-                    while x != init:
-                        for src, dst, act, heu in edges:
-                            if dst == x:
-                                x = src
-                                path.append((act, dst, heu))
-                                break
-                    return list(reversed(path))
-                if new_s not in closed_nodes:
-                    open_nodes.append(new_s)
-        closed_nodes.add(s)
+        if stats is not None:
+            stats.frontier(len(open_nodes))
+        s = open_nodes.popleft()
+        if limits is not None and limits.expand():
+            return None
+        if stats is not None:
+            stats.expanded += 1
+            stats.emit('expand', s)
+        actions = task.applicable(s)
+        if helpful is not None:
+            actions = select(infos.pop(s), actions)
+        for a in actions:
+            new_s = task.successor(s, a)
+            if stats is not None:
+                stats.generated += 1
+                stats.emit('generate', new_s)
+            if new_s in parents:
+                if stats is not None:
+                    stats.duplicates += 1
+                continue
+            parents[new_s] = (s, a)
+            new_h = evaluate(new_s)
+            if trace:
+                logger.log(TRACE, 'generate h=%s', new_h, extra={'fields': {
+                    'event': 'generate', 'h': new_h, 'parent_h': h}})
+            # Heuristics summing action costs can be 0 short of the goal
+            if new_s & goal == goal:
+                return extract_plan(task, parents, new_s, rest), new_s, new_h
+            if new_h < h:
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug('h = %s', new_h, extra={'fields': {
+                        'event': 'improve', 'h': new_h,
+                        'plateau_size': len(parents)}})
+                return extract_plan(task, parents, new_s, rest), new_s, new_h
+            if helpful is not None:
+                infos[new_s] = capture()
+            open_nodes.append(new_s)
     return None
 
 
-def enforced_hill_climbing_search(problem, rpg, init=[], goal=[]):
-    # type: (Domain) -> List[(Action, State)]
-    nodes = []
-    heapq.heapify(nodes)
-    plan = []
-    g = frozenset(goal)
-    s = frozenset(init)
-    h = rpg_heuristic(rpg, s, g)
-    print('INITIAL h = ', h)
-    while h != 0:
-        xs = _search_better_state(problem, rpg, s, g)
-        if xs is None:
+def enforced_hill_climbing_search(problem, rpg, init=[], goal=[],
+                                  helpful_actions=False, cache=None,
+                                  limits=None, stats=None, profile=None):
+    # type: (Domain) -> Plan
+    """Enforced hill climbing
+
+    `rpg` is a `RelaxedPlanningGraph` of `problem` or any heuristic accepted
+    by `best_first_search`, such as `FFHeuristic(problem)`.  With
+    `helpful_actions` each plateau is searched through helpful actions only,
+    falling back to all applicable actions when that search fails.
+
+    Heuristic values are kept in `cache`, a `HeuristicCache`, so that states
+    met again in later plateau searches are not evaluated twice.  A cache
+    with the default size is created if none is given.  `limits` is an
+    optional `SearchLimits` and `stats` an optional `SearchStatistics`.
+    `profile`, a `Profiler` or a directory, profiles the call.
+
+    """
+    if profile is not None:
+        return run_profiled(profile, 'enforced_hill_climbing_search',
+                            enforced_hill_climbing_search, problem, rpg, init,
+                            goal, helpful_actions, cache, limits, stats)
+    if stats is not None:
+        return stats.run(problem, 'search', _enforced_hill_climbing, problem,
+                         rpg, init, goal, helpful_actions, cache, limits,
+                         stats)
+    return _enforced_hill_climbing(problem, rpg, init, goal, helpful_actions,
+                                   cache, limits, None)
+
+
+def _enforced_hill_climbing(problem, rpg, init, goal, helpful_actions, cache,
+                            limits, stats):
+    task = problem.compile()
+    plan = Plan()
+    g = problem.prune_static(goal)
+    s, rest = task.split(problem.prune_static(init, init=True))
+    goal_set, goal_rest = task.split(g)
+    if not goal_rest.issubset(rest):
+        return None
+    evaluate = make_evaluator(task, rpg, g, rest)
+    if stats is not None:
+        evaluate = stats.evaluator(evaluate)
+    helpful = make_helpful(task, rpg) if helpful_actions else None
+    if cache is None:
+        cache = HeuristicCache()
+    evaluate, helpful = cache_evaluator(cache, evaluate, helpful, goal_set)
+    h = evaluate(s)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('initial h = %s', h, extra={'fields': {
+            'event': 'initial', 'h': h}})
+    while s & goal_set != goal_set:
+        result = None
+        if helpful is not None:
+            result = _search_better_state(problem, evaluate, s, goal_set,
+                                          rest, helpful, limits, stats)
+        if result is None:
+            result = _search_better_state(problem, evaluate, s, goal_set,
+                                          rest, limits=limits, stats=stats)
+        if result is None:
             return None
-        plan.extend(x[:2] for x in xs)
-        _, s, h = xs[-1]
+        path, s, h = result
+        plan.steps.extend(path)
     return plan
-
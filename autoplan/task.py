@@ -0,0 +1,311 @@
+import array
+import collections.abc
+import itertools
+import json
+import os
+import sys
+
+
+_MAGIC = b'APLNTASK'
+_VERSION = 1
+
+
+class Task:
+    """A grounded STRIPS task compiled to integer ids
+
+    Every fact of the domain gets a dense id and a search state becomes a
+    Python int whose bit `i` is set iff fact `i` holds.  Each ground action
+    `i` is described by the masks `preconditions[i]`, `add_effects[i]` and
+    `del_effects[i]`, so applicability and successor generation are single
+    bitwise operations.
+
+    Example
+    --------
+
+        task = problem.compile()
+        s = task.encode(init)
+        for i in task.applicable(s):
+            t = task.successor(s, i)
+        task.decode(t)  # frozenset of State
+
+    """
+    def __init__(self, problem):
+        # type: (Domain) -> None
+        facts = set(problem.ground_states)
+        for a in problem.ground_actions:
+            facts.update(a.preconditions, a.add_effects, a.del_effects)
+        self.facts = sorted(facts, key=_fact_key)
+        self.fact_ids = {s: i for i, s in enumerate(self.facts)}
+
+        self.actions = list(problem.ground_actions)
+        self.preconditions = [self.encode(a.preconditions)
+                              for a in self.actions]
+        self.add_effects = [self.encode(a.add_effects) for a in self.actions]
+        self.del_effects = [self.encode(a.del_effects) for a in self.actions]
+        self.costs = [getattr(a, 'cost', 1) for a in self.actions]
+        self.successor_generator = SuccessorGenerator(self.preconditions)
+
+    def encode(self, states):
+        """Return the bitmask of `states`, ignoring facts unknown to the task"""
+        mask = 0
+        for s in states:
+            i = self.fact_ids.get(s)
+            if i is not None:
+                mask |= 1 << i
+        return mask
+
+    def split(self, states):
+        """Return the bitmask of `states` and the frozenset of unknown facts
+
+        Unknown facts are never touched by any action, so they keep their
+        truth value along every plan.
+
+        """
+        states = frozenset(states)
+        return (self.encode(states),
+                frozenset(s for s in states if s not in self.fact_ids))
+
+    def decode(self, mask):
+        """Return the frozenset of facts set in `mask`"""
+        facts = self.facts
+        return frozenset([facts[i] for i in _ids(mask)])
+
+    def applicable(self, mask):
+        """Return the ids of the actions applicable in `mask`, in order"""
+        return self.successor_generator.applicable(mask)
+
+    def successor(self, mask, i):
+        """Return the state reached by applying action `i` in `mask`"""
+        return (mask | self.add_effects[i]) & ~self.del_effects[i]
+
+    def save(self, path, fingerprint=''):
+        """Write this task to `path` in the binary format read by `load`
+
+        The file starts with a JSON header naming the facts and the ground
+        actions by predicate or schema and arguments, followed by uint32
+        arrays holding the fact ids of the preconditions, add effects and
+        delete effects of every action, CSR style.  The file is written to
+        a temporary name first and renamed, so readers never see it half
+        written.
+
+        """
+        predicates = sorted({s.__class__.__name__ for s in self.facts})
+        pred_ids = {name: i for i, name in enumerate(predicates)}
+        schemas = sorted({a.__class__.__name__ for a in self.actions})
+        schema_ids = {name: i for i, name in enumerate(schemas)}
+        arrays = []
+        for masks in (self.preconditions, self.add_effects, self.del_effects):
+            offsets = array.array('I', [0])
+            ids = array.array('I')
+            for mask in masks:
+                ids.extend(_ids(mask))
+                offsets.append(len(ids))
+            arrays.extend([offsets, ids])
+
+        header = {
+            'fingerprint': fingerprint,
+            'byteorder': sys.byteorder,
+            'predicates': predicates,
+            'schemas': schemas,
+            'facts': [[pred_ids[s.__class__.__name__], *s.args]
+                      for s in self.facts],
+            'actions': [[schema_ids[a.__class__.__name__], *a.args]
+                        for a in self.actions],
+            'costs': self.costs,
+            'arrays': [len(a) for a in arrays],
+        }
+        data = json.dumps(header).encode()
+        data += b' ' * (-len(data) % 8)
+        tmp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(_MAGIC)
+            f.write(array.array('I', [_VERSION, len(data)]).tobytes())
+            f.write(data)
+            for a in arrays:
+                f.write(a.tobytes())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, problem, path, fingerprint=''):
+        # type: (Domain, str, str) -> Task
+        """Read a task written by `save` for `problem`
+
+        The file is read whole, the fact and action names are parsed from
+        its header and the masks and successor generator are rebuilt from
+        its arrays, which skips grounding but not the compilation of the
+        task.  Ground actions are only built when accessed through
+        `actions`.  Raises ValueError if the file is not a complete task
+        of this version, byte order and `fingerprint`.
+
+        """
+        with open(path, 'rb') as f:
+            data = f.read()
+        if data[:8] != _MAGIC:
+            raise ValueError("Not a task file: {}".format(path))
+        version, size = array.array('I', data[8:16])
+        if version != _VERSION:
+            raise ValueError("Unsupported task file version: {}"
+                             .format(version))
+        header = json.loads(data[16:16 + size].decode())
+        if (header['fingerprint'] != fingerprint or
+                header['byteorder'] != sys.byteorder):
+            raise ValueError("Task file does not match: {}".format(path))
+        view = memoryview(data)
+        arrays = []
+        offset = 16 + size
+        for n in header['arrays']:
+            if offset + 4 * n > len(data):
+                raise ValueError("Truncated task file: {}".format(path))
+            arrays.append(view[offset:offset + 4 * n].cast('I'))
+            offset += 4 * n
+        if offset != len(data):
+            raise ValueError("Task file has trailing data: {}".format(path))
+
+        classes = _classes(problem)
+        facts = [classes[header['predicates'][row[0]]](*row[1:])
+                 for row in header['facts']]
+        schemas = [classes[name] for name in header['schemas']]
+        return cls._from_rows(facts, schemas, header['actions'], arrays,
+                              header['costs'])
+
+    @classmethod
+    def _from_rows(cls, facts, schemas, rows, arrays, costs):
+        """Return the task of the sorted `facts` and of the actions `rows`
+
+        A row holds the index of the schema of an action in `schemas`
+        followed by its arguments.  `arrays` holds the offsets and fact ids
+        of the preconditions, add effects and delete effects of the actions,
+        CSR style, as written by `save`.
+
+        """
+        self = cls.__new__(cls)
+        self.facts = facts
+        self.fact_ids = {s: i for i, s in enumerate(facts)}
+        self.preconditions, self.add_effects, self.del_effects = [
+            _masks(arrays[i], arrays[i + 1]) for i in (0, 2, 4)]
+        self.costs = costs
+        self.actions = _GroundActions(self, schemas, rows)
+        self.successor_generator = SuccessorGenerator(self.preconditions)
+        return self
+
+
+class _GroundActions(collections.abc.Sequence):
+    """The ground actions of a `Task` built from rows, made on first access
+
+    Preconditions are taken from the task, since grounding may have pruned
+    static ones.
+
+    """
+    def __init__(self, task, schemas, rows):
+        self._task = task
+        self._schemas = schemas
+        self._rows = rows
+        self._actions = [None] * len(rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        a = self._actions[i]
+        if a is None:
+            row = self._rows[i]
+            a = self._schemas[row[0]]._ground(
+                tuple(row[1:]), self._task.decode(self._task.preconditions[i]))
+            self._actions[i] = a
+        return a
+
+
+def _fact_key(state):
+    """Sort key of the facts of a `Task`"""
+    return (state.__class__.__name__, state.args)
+
+
+def _classes(problem):
+    """Map the names of the predicates and schemas of `problem` to classes"""
+    classes = {}
+    for pred in itertools.chain(problem.predicates, problem.types):
+        classes[pred.__name__] = pred
+    for act in problem.actions:
+        classes[act.__name__] = act
+        for s in itertools.chain(act.preconditions, act.add_effects,
+                                 act.del_effects):
+            classes[s.__class__.__name__] = s.__class__
+    return classes
+
+
+def _masks(offsets, ids):
+    """Return the bitmasks of the CSR rows of fact ids `offsets`, `ids`"""
+    masks = []
+    for k in range(len(offsets) - 1):
+        mask = 0
+        for f in ids[offsets[k]:offsets[k + 1]]:
+            mask |= 1 << f
+        masks.append(mask)
+    return masks
+
+
+class SuccessorGenerator:
+    """Decision tree returning the actions applicable in a state
+
+    Preconditions are tested one fact at a time in increasing id order.  A
+    node holds the actions whose preconditions are exhausted on its path, and
+    one child per next precondition fact.  A query only descends into the
+    children whose fact holds, so it visits the applicable actions and their
+    shared precondition prefixes instead of scanning every action.
+
+    """
+    def __init__(self, preconditions):
+        # type: (List[int]) -> None
+        items = [(_bits(pre), 0, i) for i, pre in enumerate(preconditions)]
+        self._root = self._build(items)
+
+    def _build(self, items):
+        immediate = []
+        groups = {}
+        for bits, depth, i in items:
+            if depth == len(bits):
+                immediate.append(i)
+            else:
+                groups.setdefault(bits[depth], []).append((bits, depth + 1, i))
+        children = {bit: self._build(group) for bit, group in groups.items()}
+        keys = 0
+        for bit in children:
+            keys |= bit
+        return (immediate, keys, children)
+
+    def applicable(self, mask):
+        """Return the ids of the actions applicable in `mask`, in order"""
+        result = []
+        stack = [self._root]
+        while stack:
+            immediate, keys, children = stack.pop()
+            result.extend(immediate)
+            m = mask & keys
+            while m:
+                bit = m & -m
+                stack.append(children[bit])
+                m ^= bit
+        result.sort()
+        return result
+
+
+def _ids(mask):
+    """Return the ids of the bits set in `mask`, lowest first"""
+    ids = []
+    while mask:
+        bit = mask & -mask
+        ids.append(bit.bit_length() - 1)
+        mask ^= bit
+    return ids
+
+
+def _bits(mask):
+    """Return the single-bit masks set in `mask`, lowest first"""
+    bits = []
+    while mask:
+        bit = mask & -mask
+        bits.append(bit)
+        mask ^= bit
+    return bits
@@ -0,0 +1,9 @@
+"""Benchmark suite of the planners over generated domains
+
+Run it from the root of the repository:
+
+    python -m benchmarks run --out results.json
+    python -m benchmarks run --baseline results.json
+    python -m benchmarks compare results.json new.json
+
+"""
@@ -0,0 +1,69 @@
+import argparse
+import json
+import sys
+from . import harness
+from .generators import GENERATORS
+
+
+def _load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _print_result(r):
+    print('{domain:>10} {size:>3} {planner:>14}  {status:>7}  {time:8.3f}s  '
+          'expanded {expanded:>8}  length {length}'.format(
+              status='solved' if r['solved'] else 'failed',
+              length=r['plan_length'], **r), flush=True)
+
+
+def _report(regressions):
+    for r in regressions:
+        print('REGRESSION {domain} size={size} seed={seed} {planner}: '
+              '{metric} {baseline} -> {current}'.format(**r))
+    print('{} regression(s)'.format(len(regressions)))
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='run the benchmarks')
+    run.add_argument('--domains', nargs='+', default=sorted(GENERATORS),
+                     choices=sorted(GENERATORS))
+    run.add_argument('--sizes', nargs='+', type=int, default=[3, 4, 5])
+    run.add_argument('--goals', type=int, default=None,
+                     help='number of goals, all by default')
+    run.add_argument('--seeds', nargs='+', type=int, default=[0])
+    run.add_argument('--planners', nargs='+', default=sorted(harness.PLANNERS),
+                     choices=sorted(harness.PLANNERS))
+    run.add_argument('--time-limit', type=float, default=10.0,
+                     help='seconds per planner run')
+    run.add_argument('--no-memory', action='store_true',
+                     help='skip the tracemalloc pass')
+    run.add_argument('--out', help='write the JSON report to this file')
+    run.add_argument('--baseline', help='compare with this JSON report')
+
+    cmp = commands.add_parser('compare', help='compare two JSON reports')
+    cmp.add_argument('baseline')
+    cmp.add_argument('current')
+
+    args = parser.parse_args(argv)
+    if args.command == 'compare':
+        return _report(harness.compare(_load(args.baseline),
+                                       _load(args.current)))
+
+    report = harness.run(args.domains, args.sizes, args.planners,
+                         args.goals, args.seeds, args.time_limit,
+                         not args.no_memory, log=_print_result)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=1)
+    if args.baseline:
+        return _report(harness.compare(_load(args.baseline), report))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""Scalable problem generators
+
+Each generator returns `(problem, init, goal)` for a size, a number of
+goals and a seed, reusing the domains of `examples`.  The same arguments
+always give the same problem.
+
+"""
+import random
+from examples import strips_blocks_world as blocks
+from examples import strips_cake as cake
+from examples import strips_logistic as logistics
+
+
+def blocks_world(size, goals=None, seed=0):
+    """`size` blocks stacked at random, to be restacked at random
+
+    `goals` is the number of `On` facts of the goal configuration kept,
+    all of them by default.
+
+    """
+    rng = random.Random(seed)
+    objects = ['b{}'.format(i) for i in range(size)]
+    domain = type('BlocksWorld{}'.format(size), (blocks.BlocksWorld,),
+                  {'objects': objects})
+    init = _towers(rng, objects)
+    goal = [s for s in _towers(rng, objects) if isinstance(s, blocks.On)]
+    goal = goal[:goals] if goals is not None else goal
+    return domain(init=init), init, goal
+
+
+def _towers(rng, objects):
+    blocks_ = list(objects)
+    rng.shuffle(blocks_)
+    towers = [[]]
+    for b in blocks_:
+        if towers[-1] and rng.random() < 0.3:
+            towers.append([])
+        towers[-1].append(b)
+    states = []
+    for tower in towers:
+        states.append(blocks.OnTable(tower[0]))
+        states.append(blocks.Clear(tower[-1]))
+        states.extend(blocks.On(x, y) for y, x in zip(tower, tower[1:]))
+    return states
+
+
+def logistics_world(size, goals=None, seed=0):
+    """`size` cities, each with an office, an airport and a truck, one
+    airplane and `size` packets to deliver to random offices
+
+    `goals` is the number of packets with a destination, all by default.
+
+    """
+    rng = random.Random(seed)
+    L = logistics
+    cities = ['city{}'.format(i) for i in range(size)]
+    offices = ['office{}'.format(i) for i in range(size)]
+    airports = ['airport{}'.format(i) for i in range(size)]
+    trucks = ['truck{}'.format(i) for i in range(size)]
+    packets = ['packet{}'.format(i) for i in range(size)]
+    objects = cities + offices + airports + trucks + packets + ['airplane0']
+    domain = type('Logistics{}'.format(size), (L.BlocksWorld,),
+                  {'objects': objects})
+
+    init = [L.Airplane('airplane0'), L.Vehicle('airplane0'),
+            L.At('airplane0', rng.choice(airports))]
+    for i, city in enumerate(cities):
+        init += [L.City(city), L.Truck(trucks[i]), L.Vehicle(trucks[i]),
+                 L.Location(offices[i]), L.Location(airports[i]),
+                 L.Airport(airports[i]), L.Loc(offices[i], city),
+                 L.Loc(airports[i], city), L.At(trucks[i], airports[i])]
+    for p in packets:
+        init += [L.Object(p), L.At(p, rng.choice(offices))]
+    goal = [L.At(p, rng.choice(offices)) for p in packets]
+    goal = goal[:goals] if goals is not None else goal
+    return domain(init=init), init, goal
+
+
+def cake_world(size, goals=None, seed=0):
+    """`size` cakes to eat and have, `goals` of them in the goal"""
+    rng = random.Random(seed)
+    objects = ['cake{}'.format(i) for i in range(size)]
+    domain = type('CakeWorld{}'.format(size), (cake.CakeWorld,),
+                  {'objects': objects})
+    init = []
+    for c in objects:
+        init += [cake.Have(c), cake.NotEaten(c)]
+    chosen = rng.sample(objects, goals if goals is not None else size)
+    goal = []
+    for c in chosen:
+        goal += [cake.Have(c), cake.Eaten(c)]
+    return domain(), init, goal
+
+
+GENERATORS = {
+    'blocks': blocks_world,
+    'logistics': logistics_world,
+    'cake': cake_world,
+}
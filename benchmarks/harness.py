@@ -0,0 +1,147 @@
+"""Run planners over generated problems and compare results"""
+import gc
+import platform
+import sys
+import time
+import tracemalloc
+from autoplan.strips import SearchLimits
+from autoplan.strips import SearchStatistics
+from autoplan.portfolio import STRATEGIES
+from autoplan.search import Plan
+from .generators import GENERATORS
+
+
+PLANNERS = {
+    'breadth_first': STRATEGIES['breadth_first'],
+    'depth_first': STRATEGIES['depth_first'],
+    'ehc': STRATEGIES['enforced_hill_climbing'],
+    'greedy_ff': STRATEGIES['greedy_ff'],
+    'astar_max': STRATEGIES['astar_max'],
+    'graphplan': STRATEGIES['graphplan'],
+}
+
+# Relative increase of a metric over the baseline reported as a regression
+THRESHOLDS = {'time': 0.25, 'peak_memory': 0.25, 'expanded': 0.0,
+              'plan_length': 0.0}
+# Differences in seconds or bytes below these are noise
+MIN_DELTAS = {'time': 0.005, 'peak_memory': 64 * 1024}
+
+
+def cases(domains, sizes, goals=None, seeds=(0,)):
+    """Yield the `(domain, size, goals, seed)` of a benchmark run"""
+    for domain in domains:
+        if domain not in GENERATORS:
+            raise ValueError("Unknown domain: {}".format(domain))
+        for size in sizes:
+            for seed in seeds:
+                yield domain, size, goals, seed
+
+
+def run_case(domain, size, goals, seed, planner, time_limit=None,
+             memory=True):
+    """Solve one generated problem with `planner`; returns a result dict
+
+    The planner runs once for wall time and search counts and, if
+    `memory` is set, once more under `tracemalloc` for its peak memory,
+    since tracing slows it down.
+
+    """
+    problem, init, goal = GENERATORS[domain](size, goals, seed)
+    solve = PLANNERS[planner]
+    stats = SearchStatistics()
+    gc.collect()
+    start = time.perf_counter()
+    plan = solve(problem, init, goal, limits=SearchLimits(time_limit),
+                 stats=stats)
+    elapsed = time.perf_counter() - start
+    result = {
+        'domain': domain, 'size': size, 'goals': goals, 'seed': seed,
+        'planner': planner,
+        'solved': plan is not None,
+        'time': elapsed,
+        'grounding_time': problem.grounding_time,
+        'ground_actions': len(problem.ground_actions),
+        'expanded': stats.expanded,
+        'generated': stats.generated,
+        'evaluations': stats.evaluations,
+        'plan_length': None,
+        'plan_cost': None,
+        'peak_memory': None,
+    }
+    if plan is not None:
+        actions = _actions(plan)
+        result['plan_length'] = len(actions)
+        result['plan_cost'] = sum(getattr(a, 'cost', 1) for a in actions)
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            solve(problem, init, goal, limits=SearchLimits(time_limit))
+            result['peak_memory'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def _actions(plan):
+    if isinstance(plan, Plan):
+        return plan.actions
+    return [a for step in plan for a in step]
+
+
+def run(domains, sizes, planners, goals=None, seeds=(0,), time_limit=None,
+        memory=True, log=None):
+    """Run every planner on every case; returns the report dict"""
+    results = []
+    for domain, size, g, seed in cases(domains, sizes, goals, seeds):
+        for planner in planners:
+            result = run_case(domain, size, g, seed, planner, time_limit,
+                              memory)
+            results.append(result)
+            if log is not None:
+                log(result)
+    return {
+        'meta': {
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'time': time.time(),
+            'time_limit': time_limit,
+        },
+        'results': results,
+    }
+
+
+def _key(result):
+    return (result['domain'], result['size'], result['goals'],
+            result['seed'], result['planner'])
+
+
+def compare(baseline, current, thresholds=THRESHOLDS):
+    """Return the regressions of the `current` report over `baseline`
+
+    Each regression is a dict naming the case, the metric, and the
+    baseline and current values.  A case solved in the baseline and not
+    any more is a regression of 'solved'.  Cases missing from either
+    report are ignored.
+
+    """
+    base = {_key(r): r for r in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        old = base.get(_key(result))
+        if old is None:
+            continue
+        case = dict(zip(('domain', 'size', 'goals', 'seed', 'planner'),
+                        _key(result)))
+        if old['solved'] and not result['solved']:
+            regressions.append(dict(case, metric='solved', baseline=True,
+                                    current=False))
+            continue
+        for metric, threshold in thresholds.items():
+            a, b = old.get(metric), result.get(metric)
+            if a is None or b is None:
+                continue
+            if b > a * (1 + threshold) and b - a > MIN_DELTAS.get(metric, 0):
+                regressions.append(dict(case, metric=metric, baseline=a,
+                                        current=b))
+    return regressions
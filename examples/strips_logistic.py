@@ -105,7 +105,7 @@ def run():
         At('airplane1', 'airport1'),
     ]
     goal = [At('packet1', 'office2'), At('packet2', 'office2')]
-    problem = BlocksWorld()
+    problem = BlocksWorld(init)
     from pprint import pprint
     pprint(problem.ground_states)
     pprint(problem.ground_actions)
@@ -0,0 +1,60 @@
+import itertools
+import pytest
+from autoplan.planning_graph import PlanningGraph
+from benchmarks.generators import blocks_world
+from benchmarks.generators import cake_world
+from benchmarks.generators import logistics_world
+
+
+CASES = [(blocks_world, 4), (cake_world, 3), (logistics_world, 2)]
+
+
+def _action_mutexes(level, state_mutexes):
+    """Mutex action pairs of `level`, straight from the definitions"""
+    mutexes = set()
+    for a, b in itertools.combinations(level.actions, 2):
+        if (a.del_effects & (b.add_effects | b.preconditions) or
+                b.del_effects & (a.add_effects | a.preconditions) or
+                any(frozenset([s, t]) in state_mutexes
+                    for s, t in itertools.product(a.preconditions,
+                                                  b.preconditions))):
+            mutexes.add(frozenset([a, b]))
+    return mutexes
+
+
+def _state_mutexes(level, states, action_mutexes):
+    """Mutex state pairs of `states`, reached by the actions of `level`"""
+    achievers = {s: [a for a, e in level.add_edges if e == s] for s in states}
+    mutexes = set()
+    for s, t in itertools.combinations(states, 2):
+        if all(a != b and frozenset([a, b]) in action_mutexes
+               for a, b in itertools.product(achievers[s], achievers[t])):
+            mutexes.add(frozenset([s, t]))
+    return mutexes
+
+
+@pytest.mark.parametrize('generate, size', CASES)
+def test_mutexes_match_definitions(generate, size):
+    problem, init, goal = generate(size)
+    graph = PlanningGraph(problem, init, goal, materialize=True)
+    while graph.leveled_off is None:
+        graph._expand_graph()
+        now_level, new_level = graph._levels[-2:]
+        actions = _action_mutexes(now_level, now_level.mutex_states)
+        assert now_level.mutex_actions == actions
+        assert new_level.mutex_states == _state_mutexes(
+            now_level, new_level.states, actions)
+
+
+@pytest.mark.parametrize('generate, size', CASES)
+def test_solution_reaches_goal(generate, size):
+    problem, init, goal = generate(size)
+    solution = PlanningGraph(problem, init, goal).solve()
+    assert solution is not None
+    state = problem.prune_static(init)
+    for step in solution:
+        for a in step:
+            assert a.preconditions <= state
+        state = state.difference(*(a.del_effects for a in step))
+        state = state.union(*(a.add_effects for a in step))
+    assert problem.prune_static(goal) <= state
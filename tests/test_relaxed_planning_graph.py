@@ -0,0 +1,46 @@
+import random
+import pytest
+from autoplan.planning_graph import RelaxedPlanningGraph
+from benchmarks.generators import blocks_world
+from benchmarks.generators import cake_world
+from benchmarks.generators import logistics_world
+
+
+CASES = [(blocks_world, 4), (cake_world, 3), (logistics_world, 3)]
+
+
+def _random_states(problem, init, count, seed=0):
+    """Decoded states of a random walk from `init`, restarting from any
+    state visited so far"""
+    rng = random.Random(seed)
+    task = problem.compile()
+    masks = [task.encode(problem.prune_static(init))]
+    while len(masks) < count:
+        mask = rng.choice(masks)
+        actions = task.applicable(mask)
+        if actions:
+            masks.append(task.successor(mask, rng.choice(actions)))
+    return [task.decode(m) for m in masks]
+
+
+@pytest.mark.parametrize('generate, size', CASES)
+def test_incremental_matches_rebuild(generate, size):
+    problem, init, goal = generate(size)
+    full = RelaxedPlanningGraph(problem)
+    incremental = RelaxedPlanningGraph(problem, incremental=True)
+    for state in _random_states(problem, init, 200):
+        assert incremental(state, goal) == full(state, goal)
+        assert incremental.helpful_actions == full.helpful_actions
+        fresh = RelaxedPlanningGraph(problem, state, goal, incremental=True)
+        assert incremental._layers == fresh._layers
+
+
+@pytest.mark.parametrize('generate, size', CASES)
+def test_cache_returns_same_values(generate, size):
+    problem, init, goal = generate(size)
+    plain = RelaxedPlanningGraph(problem, incremental=True)
+    cached = RelaxedPlanningGraph(problem, incremental=True, cache=True)
+    states = _random_states(problem, init, 50)
+    for state in states + states:
+        assert cached(state, goal) == plain(state, goal)
+        assert cached.helpful_actions == plain.helpful_actions
@@ -0,0 +1,17 @@
+from autoplan.strips import FFHeuristic
+from autoplan.strips import HeuristicCache
+from autoplan.strips import enforced_hill_climbing_search
+from autoplan.strips import greedy_best_first_search
+from benchmarks.generators import logistics_world
+
+
+def test_cache_shared_with_and_without_helpful_actions():
+    problem, init, goal = logistics_world(2)
+    h = FFHeuristic(problem)
+    cache = HeuristicCache()
+    plan = enforced_hill_climbing_search(problem, h, init, goal, cache=cache)
+    preferred = greedy_best_first_search(problem, h, init, goal,
+                                         preferred=True, cache=cache)
+    assert plan is not None and preferred is not None
+    assert preferred.actions == greedy_best_first_search(
+        problem, h, init, goal, preferred=True).actions
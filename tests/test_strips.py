@@ -0,0 +1,73 @@
+import pickle
+
+import pytest
+
+from autoplan.strips import Action
+from autoplan.strips import Domain
+from autoplan.strips import FFHeuristic
+from autoplan.strips import State
+from autoplan.strips import enforced_hill_climbing_search
+from autoplan.strips import greedy_best_first_search
+from benchmarks.generators import logistics_world
+
+
+class P(State):
+    variables = ['?x']
+
+
+class Q(State):
+    variables = ['?x']
+
+
+class FreeA(Action):
+    variables = ['?x']
+    preconditions = [P('?x')]
+    add_effects = [Q('?x')]
+    del_effects = []
+    cost = 0
+
+
+class FreeDomain(Domain):
+    objects = ['o']
+    predicates = [P, Q]
+    actions = [FreeA]
+
+
+def test_ehc_with_zero_cost_actions_reaches_goal():
+    problem = FreeDomain()
+    h = FFHeuristic(problem)
+    assert h([P('o')], [Q('o')]) == 0
+    for plan in (enforced_hill_climbing_search(problem, h, [P('o')], [Q('o')]),
+                 greedy_best_first_search(problem, h, [P('o')], [Q('o')])):
+        assert plan.actions == [FreeA('o')]
+
+
+def test_ground_actions_are_slotted_and_immutable():
+    a = FreeA('o')
+    assert FreeA.preconditions == [P('?x')]
+    assert a.preconditions == frozenset([P('o')])
+    assert a.args == ('o',) and a.name == 'FreeA(o)'
+    assert not hasattr(a, '__dict__')
+    with pytest.raises(AttributeError):
+        a.preconditions = frozenset()
+    b = pickle.loads(pickle.dumps(a))
+    assert b == a and b.preconditions == a.preconditions
+    assert b.add_effects == a.add_effects
+
+
+def test_reachability_grounding_matches_relaxed_fixpoint():
+    problem, init, goal = logistics_world(2)
+    full = problem.__class__()
+    reached = set(init)
+    actions = set()
+    changed = True
+    while changed:
+        changed = False
+        for a in full.ground_actions:
+            if a.name not in actions and \
+                    reached.issuperset(a.preconditions - full.static_states):
+                actions.add(a.name)
+                reached.update(a.add_effects)
+                changed = True
+    assert sorted(a.name for a in problem.ground_actions) == sorted(actions)
+    assert problem.ground_states == frozenset(reached) - problem.static_states
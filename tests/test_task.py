@@ -0,0 +1,53 @@
+import pytest
+from autoplan.task import Task
+from benchmarks.generators import logistics_world
+
+
+def _masks(task):
+    return (task.facts, task.preconditions, task.add_effects,
+            task.del_effects, task.costs)
+
+
+def test_save_load_round_trip(tmp_path):
+    problem, init, goal = logistics_world(2)
+    task = problem.compile()
+    path = str(tmp_path / 'task')
+    task.save(path, 'key')
+    loaded = Task.load(problem, path, 'key')
+    assert _masks(loaded) == _masks(task)
+    assert list(loaded.actions) == list(task.actions)
+    assert [a.preconditions for a in loaded.actions] == \
+        [a.preconditions for a in task.actions]
+    with pytest.raises(ValueError):
+        Task.load(problem, path, 'other')
+
+
+@pytest.mark.parametrize('cut', [1, 4, 8])
+def test_truncated_file_is_rejected(tmp_path, cut):
+    problem, init, goal = logistics_world(2)
+    path = tmp_path / 'task'
+    problem.compile().save(str(path), 'key')
+    path.write_bytes(path.read_bytes()[:-cut])
+    with pytest.raises(ValueError):
+        Task.load(problem, str(path), 'key')
+
+
+def test_domain_regrounds_on_truncated_cache(tmp_path):
+    problem, init, goal = logistics_world(2)
+    cls = problem.__class__
+    cache = tmp_path / 'cache'
+    first = cls(cache_dir=str(cache))
+    path, = cache.iterdir()
+    path.write_bytes(path.read_bytes()[:-3])
+    second = cls(cache_dir=str(cache))
+    assert _masks(second.compile()) == _masks(first.compile())
+
+
+def test_parallel_grounding_matches_sequential():
+    cls = logistics_world(2)[0].__class__
+    problem, parallel = cls(), cls(workers=2)
+    assert _masks(parallel.compile()) == _masks(problem.compile())
+    assert list(parallel.ground_actions) == list(problem.ground_actions)
+    assert [a.preconditions for a in parallel.ground_actions] == \
+        [a.preconditions for a in problem.ground_actions]
+    assert parallel.ground_states == problem.ground_states